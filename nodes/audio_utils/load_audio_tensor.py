@@ -1,6 +1,5 @@
-import numpy as np
-
 from comfystream import tensor_cache
+from comfystream.ring_buffer import AudioRingBuffer
 
 class LoadAudioTensor:
     CATEGORY = "audio_utils"
@@ -8,7 +7,7 @@ class LoadAudioTensor:
     FUNCTION = "execute"
     
     def __init__(self):
-        self.audio_buffer = np.empty(0, dtype=np.int16)
+        self.audio_buffer = None
         self.buffer_samples = None
         self.sample_rate = None
     
@@ -17,6 +16,9 @@ class LoadAudioTensor:
         return {
             "required": {
                 "buffer_size": ("FLOAT", {"default": 500.0}),
+            },
+            "optional": {
+                "session_id": ("STRING", {"default": tensor_cache.DEFAULT_SESSION_ID}),
             }
         }
     
@@ -24,29 +26,20 @@ class LoadAudioTensor:
     def IS_CHANGED():
         return float("nan")
     
-    def execute(self, buffer_size):
+    def execute(self, buffer_size, session_id=tensor_cache.DEFAULT_SESSION_ID):
+        channels = tensor_cache.get_channels(session_id)
         if self.sample_rate is None or self.buffer_samples is None:
-            frame = tensor_cache.audio_inputs.get(block=True)
+            frame = channels.get_input(channels.audio_inputs)
             self.sample_rate = frame.sample_rate
             self.buffer_samples = int(self.sample_rate * buffer_size / 1000)
-            self.leftover = frame.side_data.input
+            # Room for a full buffer plus the leftover of the frame that completed it
+            self.audio_buffer = AudioRingBuffer(2 * self.buffer_samples)
+            self.audio_buffer.write(frame.side_data.input)
         
-        if self.leftover.shape[0] < self.buffer_samples:
-            chunks = [self.leftover] if self.leftover.size > 0 else []
-            total_samples = self.leftover.shape[0]
-            
-            while total_samples < self.buffer_samples:
-                frame = tensor_cache.audio_inputs.get(block=True)
-                if frame.sample_rate != self.sample_rate:
-                    raise ValueError("Sample rate mismatch")
-                chunks.append(frame.side_data.input)
-                total_samples += frame.side_data.input.shape[0]
-            
-            merged_audio = np.concatenate(chunks, dtype=np.int16)
-            buffered_audio = merged_audio[:self.buffer_samples]
-            self.leftover = merged_audio[self.buffer_samples:]
-        else:
-            buffered_audio = self.leftover[:self.buffer_samples]
-            self.leftover = self.leftover[self.buffer_samples:]
+        while len(self.audio_buffer) < self.buffer_samples:
+            frame = channels.get_input(channels.audio_inputs)
+            if frame.sample_rate != self.sample_rate:
+                raise ValueError("Sample rate mismatch")
+            self.audio_buffer.write(frame.side_data.input)
                 
-        return buffered_audio, self.sample_rate
+        return self.audio_buffer.read(self.buffer_samples), self.sample_rate
@@ -12,6 +12,9 @@ class SaveAudioTensor:
         return {
             "required": {
                 "audio": ("WAVEFORM",)
+            },
+            "optional": {
+                "session_id": ("STRING", {"default": tensor_cache.DEFAULT_SESSION_ID}),
             }
         }
 
@@ -19,7 +22,8 @@ class SaveAudioTensor:
     def IS_CHANGED(s):
         return float("nan")
 
-    def execute(self, audio):
-        tensor_cache.audio_outputs.put_nowait(audio)
+    def execute(self, audio, session_id=tensor_cache.DEFAULT_SESSION_ID):
+        channels = tensor_cache.get_channels(session_id)
+        channels.audio_outputs.put_nowait(audio)
         return (audio,)
 
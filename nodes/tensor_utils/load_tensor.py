@@ -1,4 +1,8 @@
-from comfystream import tensor_cache
+import torch
+
+from comfy import model_management
+from comfystream import batching, tensor_cache
+from comfystream.frame_utils import to_float_image
 
 
 class LoadTensor:
@@ -8,13 +12,44 @@ class LoadTensor:
 
     @classmethod
     def INPUT_TYPES(s):
-        return {}
+        return {
+            "optional": {
+                "device": (["cpu", "gpu"], {"default": "cpu"}),
+                "session_id": ("STRING", {"default": tensor_cache.DEFAULT_SESSION_ID}),
+            }
+        }
 
     @classmethod
     def IS_CHANGED():
         return float("nan")
 
-    def execute(self):
-        frame = tensor_cache.image_inputs.get(block=True)
-        frame.side_data.skipped = False
-        return (frame.side_data.input,)
+    def execute(self, device: str = "cpu", session_id: str = tensor_cache.DEFAULT_SESSION_ID):
+        torch_device = model_management.get_torch_device() if device == "gpu" else None
+        group = batching.get_batch_group(session_id)
+        if group is not None:
+            return (self.execute_batch(group, torch_device),)
+
+        channels = tensor_cache.get_channels(session_id)
+        frame = channels.get_input(channels.image_inputs)
+        channels.frame_drop_policy.on_inference_start()
+        channels.in_flight.start(getattr(frame.side_data, "seq", None))
+        # Frames are queued as uint8 and only converted once the workflow takes them
+        return (to_float_image(frame.side_data.input, torch_device),)
+
+    def execute_batch(self, group: batching.BatchGroup, torch_device) -> torch.Tensor:
+        images = []
+        batch = []
+        for channels, frame in group.collect():
+            image = to_float_image(frame.side_data.input, torch_device)
+            if images and image.shape[1:] != images[0].shape[1:]:
+                # Frames of another size start the next batch
+                group.defer(channels, frame)
+                continue
+            seq = getattr(frame.side_data, "seq", None)
+            channels.frame_drop_policy.on_inference_start()
+            # Members run several batches at once, their outputs are reordered like unbatched ones
+            channels.in_flight.start(seq)
+            images.append(image)
+            batch.append((channels, seq))
+        group.start(batch)
+        return torch.cat(images)
@@ -1,6 +1,7 @@
 import torch
 
-from comfystream import tensor_cache
+from comfystream import batching, tensor_cache
+from comfystream.frame_utils import to_uint8_image
 
 
 class SaveTensor:
@@ -14,6 +15,9 @@ class SaveTensor:
         return {
             "required": {
                 "images": ("IMAGE",),
+            },
+            "optional": {
+                "session_id": ("STRING", {"default": tensor_cache.DEFAULT_SESSION_ID}),
             }
         }
 
@@ -21,6 +25,32 @@ class SaveTensor:
     def IS_CHANGED(s):
         return float("nan")
 
-    def execute(self, images: torch.Tensor):
-        tensor_cache.image_outputs.put_nowait(images)
+    def execute(self, images: torch.Tensor, session_id: str = tensor_cache.DEFAULT_SESSION_ID):
+        group = batching.get_batch_group(session_id)
+        if group is not None:
+            self.execute_batch(group, images)
+            return images
+
+        channels = tensor_cache.get_channels(session_id)
+        channels.frame_drop_policy.on_inference_end()
+        # Queue the output before leaving the in-flight set so newer outputs cannot overtake it
+        channels.image_outputs.put_nowait((channels.in_flight.current(), to_uint8_image(images, channels.buffer_pool)))
+        elapsed = channels.in_flight.finish()
+        if elapsed is not None:
+            channels.inference_latency.record(elapsed)
         return images
+
+    def execute_batch(self, group: batching.BatchGroup, images: torch.Tensor):
+        batch, elapsed = group.finish()
+        if images.shape[0] != len(batch):
+            raise ValueError(f"Expected a batch of {len(batch)} images, got {images.shape[0]}")
+
+        # Scatter the batch back to the output queue of the session each frame came from
+        for (channels, seq), image in zip(batch, images.split(1)):
+            channels.frame_drop_policy.on_inference_end()
+            if elapsed is not None:
+                # Members share the cost of the batch
+                channels.inference_latency.record(elapsed / len(batch))
+            # Queue the output before leaving the in-flight set so newer outputs cannot overtake it
+            channels.image_outputs.put_nowait((seq, to_uint8_image(image, channels.buffer_pool)))
+            channels.in_flight.finish()
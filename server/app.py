@@ -5,6 +5,8 @@ import logging
 import os
 import sys
 
+from typing import List, Optional
+
 import torch
 
 # Initialize CUDA before any other imports to prevent core dump.
@@ -22,9 +24,13 @@ from aiortc import (
 )
 from aiortc.codecs import h264
 from aiortc.rtcrtpsender import RTCRtpSender
+from comfystream.client import EXECUTION_MODES
+from comfystream.frame_drop import FRAME_DROP_POLICIES
+from comfystream.model_host import ModelHost
 from pipeline import Pipeline
+from pipeline_pool import PipelinePool
 from twilio.rest import Client
-from utils import patch_loop_datagram, add_prefix_to_app_routes, FPSMeter
+from utils import patch_loop_datagram, add_prefix_to_app_routes, FPSMeter, AdmissionController, SessionLoad
 from metrics import MetricsManager, StreamStatsManager
 import time
 
@@ -36,6 +42,14 @@ logging.getLogger("aiortc.rtcrtpreceiver").setLevel(logging.WARNING)
 MAX_BITRATE = 2000000
 MIN_BITRATE = 2000000
 
+# Seconds between admission checks of a waiting offer, and suggested to rejected clients
+ADMISSION_POLL_INTERVAL = 0.5
+ADMISSION_RETRY_AFTER = 5
+# Seconds a peer connection has to connect before it and its pipeline are closed
+CONNECTION_TIMEOUT = 30
+# Streams the model host is sized for when --max-sessions is not set
+DEFAULT_MAX_STREAMS = 8
+
 
 class VideoStreamTrack(MediaStreamTrack):
     """video stream track that processes video frames using a pipeline.
@@ -107,6 +121,12 @@ class VideoStreamTrack(MediaStreamTrack):
 
         # Increment the frame count to calculate FPS.
         await self.fps_meter.increment_frame_count()
+        app["metrics_manager"].update_dropped_outputs_metrics(
+            self.pipeline.get_output_drop_counts(), self.track.id
+        )
+        app["metrics_manager"].update_prompt_restarts_metrics(
+            self.pipeline.get_restart_counts(), self.track.id
+        )
 
         return processed_frame
 
@@ -200,148 +220,298 @@ def get_ice_servers():
     return ice_servers
 
 
+def stream_capacity(app: web.Application) -> int:
+    """Get the number of concurrent streams the server runs."""
+    return app.get("max_sessions") or DEFAULT_MAX_STREAMS
+
+
+def model_host_workers(app: web.Application, pooled_pipelines: int = 0) -> int:
+    """Get the number of workers the shared model host needs.
+
+    Idle prompts hold a worker while they wait for a frame, so every stream and pooled
+    pipeline needs its own: one per worker of its video prompt plus one for an audio prompt.
+    """
+    return (app.get("max_workers", 1) + 1) * (stream_capacity(app) + pooled_pipelines)
+
+
+def new_pipeline(app: web.Application) -> Pipeline:
+    """Create a pipeline sharing the models loaded by the app's host."""
+    return Pipeline(model_host=app["model_host"], **app["pipeline_kwargs"])
+
+
+async def create_pipeline(app: web.Application, prompts) -> Pipeline:
+    """Get a pipeline running the prompts for a new stream, prewarmed if the pool has one."""
+    pipeline = await app["pipeline_pool"].claim(prompts) if app["pipeline_pool"] else None
+    if pipeline is None:
+        pipeline = new_pipeline(app)
+        await pipeline.set_prompts(prompts)
+    app["pipelines"].add(pipeline)
+    return pipeline
+
+
+async def close_pipeline(app: web.Application, pipeline: Pipeline):
+    if pipeline in app["pipelines"]:
+        app["pipelines"].discard(pipeline)
+        await pipeline.close()
+
+
+async def get_session_loads(app: web.Application) -> List[SessionLoad]:
+    """Get the measured load of every running stream."""
+    fps = {}
+    for track in list(app["video_tracks"].values()):
+        fps[id(track.pipeline)] = await track.fps_meter.fps
+    # Read the pipelines after the last await so the caller gets a current snapshot
+    return [
+        SessionLoad(fps=fps.get(id(pipeline), 0.0), inference_time=pipeline.get_inference_time())
+        for pipeline in app["pipelines"]
+    ]
+
+
+async def admit_stream(app: web.Application) -> Optional[str]:
+    """Wait up to the admission wait for capacity for a new stream.
+
+    An admitted stream reserves its slot until its pipeline is registered, so offers
+    admitted concurrently are checked against each other. The caller must release the
+    reservation with ``release_reservation``.
+
+    Returns:
+        None if the stream is admitted, otherwise the reason it is rejected.
+    """
+    deadline = time.monotonic() + app["admission_wait"]
+    while True:
+        loads = await get_session_loads(app)
+        # Nothing is awaited between the check and the reservation
+        loads += [SessionLoad(fps=0.0, inference_time=None)] * app["reserved_streams"]
+        reason = app["admission_controller"].check(loads)
+        if reason is None:
+            app["reserved_streams"] += 1
+            return None
+        if time.monotonic() >= deadline:
+            return reason
+        await asyncio.sleep(ADMISSION_POLL_INTERVAL)
+
+
+def release_reservation(app: web.Application):
+    """Release the slot reserved by an admitted stream, once its pipeline is registered or creating it failed."""
+    app["reserved_streams"] -= 1
+
+
+async def send_ready(channel, pipeline: Pipeline):
+    """Send a ready message on the control channel once the pipeline's warmups are done."""
+    success = await pipeline.wait_ready()
+    if channel.readyState == "open":
+        channel.send(json.dumps({"type": "ready", "success": success}))
+
+
 async def offer(request):
-    pipeline = request.app["pipeline"]
     pcs = request.app["pcs"]
 
     params = await request.json()
 
-    await pipeline.set_prompts(params["prompts"])
-
-    offer_params = params["offer"]
-    offer = RTCSessionDescription(sdp=offer_params["sdp"], type=offer_params["type"])
-
-    ice_servers = get_ice_servers()
-    if len(ice_servers) > 0:
-        pc = RTCPeerConnection(
-            configuration=RTCConfiguration(iceServers=get_ice_servers())
+    frame_drop_policy = params.get("frame_drop_policy")
+    if frame_drop_policy is not None and frame_drop_policy not in FRAME_DROP_POLICIES:
+        return web.Response(
+            status=400,
+            content_type="application/json",
+            text=json.dumps(
+                {"error": f"Unknown frame drop policy '{frame_drop_policy}', expected one of {list(FRAME_DROP_POLICIES)}"}
+            ),
         )
-    else:
-        pc = RTCPeerConnection()
 
-    pcs.add(pc)
+    reason = await admit_stream(request.app)
+    if reason is not None:
+        logger.warning(f"Rejecting stream: {reason}")
+        return web.Response(
+            status=503,
+            content_type="application/json",
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            text=json.dumps({"error": reason}),
+        )
 
-    tracks = {"video": None, "audio": None}
+    # Every peer connection streams through its own pipeline
+    try:
+        pipeline = await create_pipeline(request.app, params["prompts"])
+    finally:
+        release_reservation(request.app)
+    pc = None
+    try:
+        if frame_drop_policy is not None:
+            pipeline.set_frame_drop_policy(frame_drop_policy)
+
+        offer_params = params["offer"]
+        offer = RTCSessionDescription(sdp=offer_params["sdp"], type=offer_params["type"])
+
+        ice_servers = get_ice_servers()
+        if len(ice_servers) > 0:
+            pc = RTCPeerConnection(
+                configuration=RTCConfiguration(iceServers=get_ice_servers())
+            )
+        else:
+            pc = RTCPeerConnection()
+
+        pcs.add(pc)
+
+        tracks = {"video": None, "audio": None}
     
-    # Flag to track if we've received resolution update
-    resolution_received = {"value": False}
-
-    # Only add video transceiver if video is present in the offer
-    if "m=video" in offer.sdp:
-        # Prefer h264
-        transceiver = pc.addTransceiver("video")
-        caps = RTCRtpSender.getCapabilities("video")
-        prefs = list(filter(lambda x: x.name == "H264", caps.codecs))
-        transceiver.setCodecPreferences(prefs)
-
-        # Monkey patch max and min bitrate to ensure constant bitrate
-        h264.MAX_BITRATE = MAX_BITRATE
-        h264.MIN_BITRATE = MIN_BITRATE
-
-    # Handle control channel from client
-    @pc.on("datachannel")
-    def on_datachannel(channel):
-        if channel.label == "control":
-
-            @channel.on("message")
-            async def on_message(message):
-                try:
-                    params = json.loads(message)
-
-                    if params.get("type") == "get_nodes":
-                        nodes_info = await pipeline.get_nodes_info()
-                        response = {"type": "nodes_info", "nodes": nodes_info}
-                        channel.send(json.dumps(response))
-                    elif params.get("type") == "update_prompts":
-                        if "prompts" not in params:
-                            logger.warning(
-                                "[Control] Missing prompt in update_prompt message"
-                            )
-                            return
-                        await pipeline.update_prompts(params["prompts"])
-                        response = {"type": "prompts_updated", "success": True}
-                        channel.send(json.dumps(response))
-                    elif params.get("type") == "update_resolution":
-                        if "width" not in params or "height" not in params:
-                            logger.warning("[Control] Missing width or height in update_resolution message")
-                            return
-                        # Update pipeline resolution for future frames
-                        pipeline.width = params["width"]
-                        pipeline.height = params["height"]
-                        logger.info(f"[Control] Updated resolution to {params['width']}x{params['height']}")
+        # Flag to track if we've received resolution update
+        resolution_received = {"value": False}
+        # Flag to track if the client has been told the pipeline is ready
+        ready_sent = {"value": False}
+
+        # Only add video transceiver if video is present in the offer
+        if "m=video" in offer.sdp:
+            # Prefer h264
+            transceiver = pc.addTransceiver("video")
+            caps = RTCRtpSender.getCapabilities("video")
+            prefs = list(filter(lambda x: x.name == "H264", caps.codecs))
+            transceiver.setCodecPreferences(prefs)
+
+            # Monkey patch max and min bitrate to ensure constant bitrate
+            h264.MAX_BITRATE = MAX_BITRATE
+            h264.MIN_BITRATE = MIN_BITRATE
+
+        # Handle control channel from client
+        @pc.on("datachannel")
+        def on_datachannel(channel):
+            if channel.label == "control":
+                # Tell the client once the warmups started with the offer are done. Video is
+                # only ready once warmed at the resolution the client sends, unless a pooled
+                # pipeline already is
+                if "m=video" not in pc.remoteDescription.sdp or pipeline.warm_video_resolution == (
+                    pipeline.width, pipeline.height
+                ):
+                    ready_sent["value"] = True
+                    asyncio.create_task(send_ready(channel, pipeline))
+
+                @channel.on("message")
+                async def on_message(message):
+                    try:
+                        params = json.loads(message)
+
+                        if params.get("type") == "get_nodes":
+                            nodes_info = await pipeline.get_nodes_info()
+                            response = {"type": "nodes_info", "nodes": nodes_info}
+                            channel.send(json.dumps(response))
+                        elif params.get("type") == "update_prompts":
+                            if "prompts" not in params:
+                                logger.warning(
+                                    "[Control] Missing prompt in update_prompt message"
+                                )
+                                return
+                            # Updates are coalesced, a superseded update is acknowledged without being applied
+                            applied = await pipeline.update_prompts(params["prompts"])
+                            response = {"type": "prompts_updated", "success": True, "superseded": not applied}
+                            channel.send(json.dumps(response))
+                        elif params.get("type") == "update_resolution":
+                            if "width" not in params or "height" not in params:
+                                logger.warning("[Control] Missing width or height in update_resolution message")
+                                return
+                            # Update pipeline resolution for future frames
+                            pipeline.width = params["width"]
+                            pipeline.height = params["height"]
+                            logger.info(f"[Control] Updated resolution to {params['width']}x{params['height']}")
                         
-                        # Mark that we've received resolution
-                        resolution_received["value"] = True
+                            # Mark that we've received resolution
+                            resolution_received["value"] = True
                         
-                        # Warm the video pipeline with the new resolution
-                        if "m=video" in pc.remoteDescription.sdp:
-                            await pipeline.warm_video()
+                            # Warm the video pipeline with the new resolution in the background,
+                            # frames pass through until it is done and a ready message follows
+                            needs_warmup = "m=video" in pc.remoteDescription.sdp and pipeline.warm_video_resolution != (
+                                params["width"], params["height"]
+                            )
+                            if needs_warmup:
+                                pipeline.start_video_warmup()
+                            if needs_warmup or not ready_sent["value"]:
+                                ready_sent["value"] = True
+                                asyncio.create_task(send_ready(channel, pipeline))
                             
-                        response = {
-                            "type": "resolution_updated",
-                            "success": True
-                        }
-                        channel.send(json.dumps(response))
-                    else:
-                        logger.warning(
-                            "[Server] Invalid message format - missing required fields"
-                        )
-                except json.JSONDecodeError:
-                    logger.error("[Server] Invalid JSON received")
-                except Exception as e:
-                    logger.error(f"[Server] Error processing message: {str(e)}")
-
-    @pc.on("track")
-    def on_track(track):
-        logger.info(f"Track received: {track.kind}")
-        if track.kind == "video":
-            videoTrack = VideoStreamTrack(track, pipeline)
-            tracks["video"] = videoTrack
-            sender = pc.addTrack(videoTrack)
-
-            # Store video track in app for stats.
-            stream_id = track.id
-            request.app["video_tracks"][stream_id] = videoTrack
-
-            codec = "video/H264"
-            force_codec(pc, sender, codec)
-        elif track.kind == "audio":
-            audioTrack = AudioStreamTrack(track, pipeline)
-            tracks["audio"] = audioTrack
-            pc.addTrack(audioTrack)
+                            response = {
+                                "type": "resolution_updated",
+                                "success": True
+                            }
+                            channel.send(json.dumps(response))
+                        else:
+                            logger.warning(
+                                "[Server] Invalid message format - missing required fields"
+                            )
+                    except json.JSONDecodeError:
+                        logger.error("[Server] Invalid JSON received")
+                    except Exception as e:
+                        logger.error(f"[Server] Error processing message: {str(e)}")
+
+        @pc.on("track")
+        def on_track(track):
+            logger.info(f"Track received: {track.kind}")
+            if track.kind == "video":
+                videoTrack = VideoStreamTrack(track, pipeline)
+                tracks["video"] = videoTrack
+                sender = pc.addTrack(videoTrack)
+
+                # Store video track in app for stats.
+                stream_id = track.id
+                request.app["video_tracks"][stream_id] = videoTrack
+
+                codec = "video/H264"
+                force_codec(pc, sender, codec)
+            elif track.kind == "audio":
+                audioTrack = AudioStreamTrack(track, pipeline)
+                tracks["audio"] = audioTrack
+                pc.addTrack(audioTrack)
+
+            @track.on("ended")
+            async def on_ended():
+                logger.info(f"{track.kind} track ended")
+                request.app["video_tracks"].pop(track.id, None)
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            logger.info(f"Connection state is: {pc.connectionState}")
+            if pc.connectionState == "failed":
+                await pc.close()
+                pcs.discard(pc)
+                await close_pipeline(request.app, pipeline)
+            elif pc.connectionState == "closed":
+                await pc.close()
+                pcs.discard(pc)
+                await close_pipeline(request.app, pipeline)
+
+        await pc.setRemoteDescription(offer)
+
+        # Only warm audio here, video warming happens after resolution update. Warmup runs
+        # in the background so it does not delay the answer.
+        if "m=audio" in pc.remoteDescription.sdp and not pipeline.audio_warmed:
+            pipeline.start_audio_warmup()
+    
+        # We no longer warm video here - it will be warmed after receiving resolution
 
-        @track.on("ended")
-        async def on_ended():
-            logger.info(f"{track.kind} track ended")
-            request.app["video_tracks"].pop(track.id, None)
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
 
-    @pc.on("connectionstatechange")
-    async def on_connectionstatechange():
-        logger.info(f"Connection state is: {pc.connectionState}")
-        if pc.connectionState == "failed":
-            await pc.close()
+        asyncio.create_task(close_if_unconnected(request.app, pc, pipeline))
+
+        return web.Response(
+            content_type="application/json",
+            text=json.dumps(
+                {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+            ),
+        )
+    except Exception:
+        # Release the pipeline right away, the connection state handlers never run for it
+        if pc is not None:
             pcs.discard(pc)
-        elif pc.connectionState == "closed":
             await pc.close()
-            pcs.discard(pc)
+        await close_pipeline(request.app, pipeline)
+        raise
 
-    await pc.setRemoteDescription(offer)
+async def close_if_unconnected(app: web.Application, pc: RTCPeerConnection, pipeline: Pipeline):
+    """Close a peer connection and its pipeline if it does not connect in time."""
+    await asyncio.sleep(CONNECTION_TIMEOUT)
+    if pc.connectionState in ("new", "connecting"):
+        logger.warning(f"Peer connection did not connect within {CONNECTION_TIMEOUT}s, closing it")
+        app["pcs"].discard(pc)
+        await pc.close()
+        await close_pipeline(app, pipeline)
 
-    # Only warm audio here, video warming happens after resolution update
-    if "m=audio" in pc.remoteDescription.sdp:
-        await pipeline.warm_audio()
-    
-    # We no longer warm video here - it will be warmed after receiving resolution
-
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
-
-    return web.Response(
-        content_type="application/json",
-        text=json.dumps(
-            {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
-        ),
-    )
 
 async def cancel_collect_frames(track):
     track.running = False
@@ -353,10 +523,9 @@ async def cancel_collect_frames(track):
             pass
 
 async def set_prompt(request):
-    pipeline = request.app["pipeline"]
-
     prompt = await request.json()
-    await pipeline.set_prompts(prompt)
+    for pipeline in list(request.app["pipelines"]):
+        await pipeline.set_prompts(prompt)
 
     return web.Response(content_type="application/json", text="OK")
 
@@ -369,18 +538,47 @@ async def on_startup(app: web.Application):
     if app["media_ports"]:
         patch_loop_datagram(app["media_ports"])
 
-    app["pipeline"] = Pipeline(
-        width=512,
-        height=512,
+    warm_workflows = app.get("warm_workflows", [])
+    pool_size = app.get("warm_pool_size", 0) if warm_workflows else 0
+
+    # Streams beyond the capacity the host is sized for would wait for a worker forever
+    app["admission_controller"] = AdmissionController(
+        fps_floor=app.get("fps_floor", 0.0), max_sessions=stream_capacity(app)
+    )
+
+    # Models are loaded once into the host and shared by the pipelines of all streams
+    app["model_host"] = ModelHost(
+        max_workers=model_host_workers(app, pool_size * len(warm_workflows)),
         cwd=app["workspace"], 
         disable_cuda_malloc=True, 
         gpu_only=True, 
         preview_method='none',
+    )
+    app["pipeline_kwargs"] = dict(
+        width=512,
+        height=512,
         comfyui_inference_log_level=app.get("comfui_inference_log_level", None),
+        frame_drop_policy=app.get("frame_drop_policy", None),
+        execution_mode=app.get("execution_mode", "queue"),
+        max_workers=app.get("max_workers", 1),
+        max_batch_size=app.get("max_batch_size", 1),
+        max_batch_wait=app.get("max_batch_wait_ms", 5) / 1000,
     )
+    app["pipelines"] = set()
+    # Admitted streams whose pipeline is not registered yet
+    app["reserved_streams"] = 0
     app["pcs"] = set()
     app["video_tracks"] = {}
 
+    app["pipeline_pool"] = None
+    if pool_size > 0:
+        width, height = app["warm_resolution"]
+        app["pipeline_pool"] = PipelinePool(lambda: new_pipeline(app), pool_size)
+        for path in warm_workflows:
+            with open(path) as f:
+                app["pipeline_pool"].add_workflow(json.load(f), width, height)
+        app["pipeline_pool"].start()
+
 
 async def on_shutdown(app: web.Application):
     pcs = app["pcs"]
@@ -388,6 +586,12 @@ async def on_shutdown(app: web.Application):
     await asyncio.gather(*coros)
     pcs.clear()
 
+    if app["pipeline_pool"]:
+        await app["pipeline_pool"].close()
+    for pipeline in list(app["pipelines"]):
+        await close_pipeline(app, pipeline)
+    await app["model_host"].stop()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run comfystream server")
@@ -429,6 +633,71 @@ if __name__ == "__main__":
         choices=logging._nameToLevel.keys(),
         help="Set the logging level for ComfyUI inference",
     )
+    parser.add_argument(
+        "--frame-drop-policy",
+        default="latest",
+        choices=list(FRAME_DROP_POLICIES),
+        help="Set the default policy for dropping video frames when inference falls behind",
+    )
+    parser.add_argument(
+        "--execution-mode",
+        default="queue",
+        choices=EXECUTION_MODES,
+        help="Queue each frame through ComfyUI or run a compiled execution plan per frame",
+    )
+    parser.add_argument(
+        "--max-workers",
+        default=1,
+        type=int,
+        help="Set the number of video frames processed concurrently, outputs are reordered to input order",
+    )
+    parser.add_argument(
+        "--fps-floor",
+        default=0.0,
+        type=float,
+        help="Reject new streams that would bring running streams below this output FPS, 0 to disable",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        default=None,
+        type=int,
+        help=f"Set the maximum number of concurrent streams, defaults to {DEFAULT_MAX_STREAMS}",
+    )
+    parser.add_argument(
+        "--admission-wait",
+        default=0.0,
+        type=float,
+        help="Set how many seconds an offer waits for capacity before it is rejected",
+    )
+    parser.add_argument(
+        "--warm-pool-size",
+        default=0,
+        type=int,
+        help="Set the number of prewarmed pipelines kept for each warm workflow",
+    )
+    parser.add_argument(
+        "--warm-workflow",
+        action="append",
+        default=[],
+        help="Path to a workflow in API format to keep prewarmed pipelines of, can be repeated",
+    )
+    parser.add_argument(
+        "--warm-resolution",
+        default="512x512",
+        help="Set the resolution prewarmed pipelines are warmed at, as WIDTHxHEIGHT",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        default=1,
+        type=int,
+        help="Batch frames of up to this many streams running the same video workflow into one execution",
+    )
+    parser.add_argument(
+        "--max-batch-wait-ms",
+        default=5,
+        type=float,
+        help="Set how long a batch waits for frames of other streams before executing",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -440,6 +709,17 @@ if __name__ == "__main__":
     app = web.Application()
     app["media_ports"] = args.media_ports.split(",") if args.media_ports else None
     app["workspace"] = args.workspace
+    app["frame_drop_policy"] = args.frame_drop_policy
+    app["execution_mode"] = args.execution_mode
+    app["max_workers"] = args.max_workers
+    app["max_batch_size"] = args.max_batch_size
+    app["max_batch_wait_ms"] = args.max_batch_wait_ms
+    app["fps_floor"] = args.fps_floor
+    app["admission_wait"] = args.admission_wait
+    app["max_sessions"] = args.max_sessions
+    app["warm_pool_size"] = args.warm_pool_size
+    app["warm_workflows"] = args.warm_workflow
+    app["warm_resolution"] = tuple(int(v) for v in args.warm_resolution.lower().split("x"))
 
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
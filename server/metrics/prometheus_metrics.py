@@ -2,7 +2,7 @@
 
 from prometheus_client import Gauge, generate_latest
 from aiohttp import web
-from typing import Optional
+from typing import Dict, Optional
 
 
 class MetricsManager:
@@ -21,6 +21,16 @@ class MetricsManager:
         self._fps_gauge = Gauge(
             "stream_fps", "Frames per second of the stream", base_labels
         )
+        self._dropped_outputs_gauge = Gauge(
+            "stream_dropped_outputs",
+            "Processed outputs dropped because sending fell behind (video frames, audio samples)",
+            base_labels + ["kind"],
+        )
+        self._prompt_restarts_gauge = Gauge(
+            "stream_prompt_restarts",
+            "Restarts of prompts after a failed frame",
+            base_labels + ["prompt"],
+        )
 
     def enable(self):
         """Enable Prometheus metrics collection."""
@@ -39,6 +49,42 @@ class MetricsManager:
             else:
                 self._fps_gauge.set(fps)
 
+    def update_dropped_outputs_metrics(
+        self, dropped: Dict[str, int], stream_id: Optional[str] = None
+    ):
+        """Update Prometheus metrics for dropped outputs of a given stream.
+
+        Args:
+            dropped: The number of dropped outputs keyed by kind.
+            stream_id: The ID of the stream.
+        """
+        if self._enabled:
+            for kind, count in dropped.items():
+                if self._include_stream_id:
+                    self._dropped_outputs_gauge.labels(
+                        stream_id=stream_id or "", kind=kind
+                    ).set(count)
+                else:
+                    self._dropped_outputs_gauge.labels(kind=kind).set(count)
+
+    def update_prompt_restarts_metrics(
+        self, restarts: Dict[int, int], stream_id: Optional[str] = None
+    ):
+        """Update Prometheus metrics for prompt restarts of a given stream.
+
+        Args:
+            restarts: The number of restarts keyed by prompt index.
+            stream_id: The ID of the stream.
+        """
+        if self._enabled:
+            for prompt_index, count in restarts.items():
+                if self._include_stream_id:
+                    self._prompt_restarts_gauge.labels(
+                        stream_id=stream_id or "", prompt=str(prompt_index)
+                    ).set(count)
+                else:
+                    self._prompt_restarts_gauge.labels(prompt=str(prompt_index)).set(count)
+
     async def metrics_handler(self, _):
         """Handle Prometheus metrics endpoint."""
         return web.Response(body=generate_latest(), content_type="text/plain")
@@ -26,13 +26,17 @@ class StreamStatsManager:
             video_track: The video stream track instance.
 
         Returns:
-            A dictionary containing FPS-related statistics.
+            A dictionary containing FPS-related, dropped output, prompt restart and
+            execution timing statistics.
         """
         return {
             "timestamp": await video_track.fps_meter.last_fps_calculation_time,
             "fps": await video_track.fps_meter.fps,
             "minute_avg_fps": await video_track.fps_meter.average_fps,
             "minute_fps_array": await video_track.fps_meter.fps_measurements,
+            "dropped_outputs": video_track.pipeline.get_output_drop_counts(),
+            "prompt_restarts": video_track.pipeline.get_restart_counts(),
+            "node_timings": video_track.pipeline.get_node_timings(),
         }
 
     async def collect_all_stream_metrics(self, _) -> web.Response:
@@ -4,11 +4,16 @@ import numpy as np
 import asyncio
 import logging
 
-from typing import Any, Dict, Union, List
+from typing import Any, Dict, Optional, Tuple, Union, List
 from comfystream.client import ComfyStreamClient
-from utils import temporary_log_level
+from comfystream.frame_utils import YUV420Planes, plane_view, rgb_to_yuv420, yuv420p_planes
+from comfystream.ring_buffer import AudioRingBuffer
+from utils import temporary_log_level, PendingFrames
 
 WARMUP_RUNS = 5
+MAX_PENDING_VIDEO_FRAMES = 30
+# Initial capacity of the processed audio buffer, one second of 48kHz mono audio
+AUDIO_BUFFER_SAMPLES = 48000
 
 logger = logging.getLogger(__name__)
 
@@ -25,23 +30,144 @@ class Pipeline:
         self.width = kwargs.get("width", 512)
         self.height = kwargs.get("height", 512)
 
-        self.video_incoming_frames = asyncio.Queue()
+        self.video_incoming_frames = PendingFrames(maxlen=MAX_PENDING_VIDEO_FRAMES)
+        self._video_seq = 0
+        self._last_video_timing = None
         self.audio_incoming_frames = asyncio.Queue()
 
-        self.processed_audio_buffer = np.array([], dtype=np.int16)
+        self.processed_audio_buffer = AudioRingBuffer(AUDIO_BUFFER_SAMPLES)
+        self._audio_out = np.empty(0, dtype=np.int16)
 
         self._comfyui_inference_log_level = comfyui_inference_log_level
 
+        # Resolution the video path was last warmed at and whether the audio path was warmed
+        self.warm_video_resolution: Optional[Tuple[int, int]] = None
+        self.audio_warmed = False
+
+        # Background warmups, incoming frames pass through unprocessed while they run
+        self._video_warmup: Optional[asyncio.Task] = None
+        self._audio_warmup: Optional[asyncio.Task] = None
+        # Latest passed through video frame, None wakes the consumer once warmup is done
+        self._video_passthrough: asyncio.Queue = asyncio.Queue(maxsize=1)
+        # One reader of the client's video outputs at a time, a warmup output taken by
+        # the stream consumer is handed to the running warmup
+        self._video_output_lock = asyncio.Lock()
+        self._warmup_outputs: asyncio.Queue = asyncio.Queue()
+
+    @property
+    def video_ready(self) -> bool:
+        return self._video_warmup is None or self._video_warmup.done()
+
+    @property
+    def audio_ready(self) -> bool:
+        return self._audio_warmup is None or self._audio_warmup.done()
+
+    def _put_passthrough_video(self, frame: Optional[av.VideoFrame]):
+        if self._video_passthrough.full():
+            self._video_passthrough.get_nowait()
+        self._video_passthrough.put_nowait(frame)
+
+    def start_video_warmup(self) -> asyncio.Task:
+        """Warm the video path at the current resolution in the background.
+
+        Incoming video frames are passed through unprocessed until the warmup is done.
+        A warmup started while another runs waits for it, and is skipped if the
+        resolution did not change meanwhile.
+        """
+        previous = self._video_warmup
+
+        async def warmup():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                if self.warm_video_resolution != (self.width, self.height):
+                    await self.warm_video()
+            finally:
+                self._put_passthrough_video(None)
+
+        self._video_warmup = asyncio.create_task(warmup())
+        return self._video_warmup
+
+    def start_audio_warmup(self) -> asyncio.Task:
+        """Warm the audio path in the background, passing audio through until it is done."""
+        if self._audio_warmup is None:
+            self._audio_warmup = asyncio.create_task(self.warm_audio())
+        return self._audio_warmup
+
+    async def wait_ready(self) -> bool:
+        """Wait for the running warmups to finish.
+
+        Returns:
+            True if they succeeded, False if one of them failed.
+        """
+        warmups = [task for task in (self._video_warmup, self._audio_warmup) if task is not None]
+        results = await asyncio.gather(*warmups, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error warming pipeline: {str(result)}")
+                return False
+        return True
+
+    async def warm(self):
+        """Warm the video and audio paths the pipeline's prompts process."""
+        class_types = {
+            node.get("class_type") for prompt in self.client.current_prompts for node in prompt.values()
+        }
+        if "LoadTensor" in class_types:
+            await self.warm_video()
+        if "LoadAudioTensor" in class_types:
+            await self.warm_audio()
+
     async def warm_video(self):
         # Create dummy frame with the CURRENT resolution settings (which might have been updated via control channel)
         dummy_frame = av.VideoFrame()
-        dummy_frame.side_data.input = torch.randn(1, self.height, self.width, 3)
+        dummy_frame.side_data.input = torch.randint(0, 256, (1, self.height, self.width, 3), dtype=torch.uint8)
+        dummy_frame.side_data.seq = None
         
         logger.info(f"Warming video pipeline with resolution {self.width}x{self.height}")
 
+        # Drop outputs a cancelled warmup left behind
+        while not self._warmup_outputs.empty():
+            self.client.release_video_output(self._warmup_outputs.get_nowait())
+
         for _ in range(WARMUP_RUNS):
-            self.client.put_video_input(dummy_frame)
-            await self.client.get_video_output()
+            self.client.put_video_input(dummy_frame, droppable=False)
+            self.client.release_video_output(await self._get_warmup_video_output())
+        self.warm_video_resolution = (self.width, self.height)
+
+    async def _get_warmup_video_output(self) -> Any:
+        """Get the output of the next warmup frame.
+
+        Outputs of stream frames that were in flight when the warmup started are dropped.
+        """
+        while self._warmup_outputs.empty():
+            async with self._video_output_lock:
+                if not self._warmup_outputs.empty():
+                    break
+                seq, output = await self.client.get_sequenced_video_output()
+                if seq is None:
+                    return output
+                self.client.release_video_output(output)
+        return self._warmup_outputs.get_nowait()
+
+    async def _get_stream_video_output(self) -> Optional[Tuple[Optional[int], Any]]:
+        """Get the next video output of a stream frame.
+
+        Returns:
+            The sequence number and output, or None if the output was of a warmup frame
+            started while waiting. It is handed to the warmup then.
+        """
+        async with self._video_output_lock:
+            seq, output = await self.client.get_sequenced_video_output()
+        if seq is not None:
+            return seq, output
+
+        if self.video_ready:
+            # The warmup this output belonged to was cancelled
+            self.client.release_video_output(output)
+        else:
+            self._warmup_outputs.put_nowait(output)
+        return None
 
     async def warm_audio(self):
         dummy_frame = av.AudioFrame()
@@ -51,6 +177,7 @@ class Pipeline:
         for _ in range(WARMUP_RUNS):
             self.client.put_audio_input(dummy_frame)
             await self.client.get_audio_output()
+        self.audio_warmed = True
 
     async def set_prompts(self, prompts: Union[Dict[Any, Any], List[Dict[Any, Any]]]):
         if isinstance(prompts, list):
@@ -58,62 +185,112 @@ class Pipeline:
         else:
             await self.client.set_prompts([prompts])
 
-    async def update_prompts(self, prompts: Union[Dict[Any, Any], List[Dict[Any, Any]]]):
+    async def set_batching(self, enabled: bool):
+        """Let the prompts batch frames with other streams running the same workflow."""
+        await self.client.set_batching(enabled)
+
+    def set_frame_drop_policy(self, policy: Optional[str] = None):
+        """Select the frame drop policy used when the workflow falls behind the input."""
+        self.client.set_frame_drop_policy(policy)
+
+    async def update_prompts(self, prompts: Union[Dict[Any, Any], List[Dict[Any, Any]]]) -> bool:
+        """Update the running prompts at the next frame boundary.
+
+        Returns:
+            True if the update was applied, False if a newer update superseded it.
+        """
         if isinstance(prompts, list):
-            await self.client.update_prompts(prompts)
+            return await self.client.submit_prompt_update(prompts)
         else:
-            await self.client.update_prompts([prompts])
+            return await self.client.submit_prompt_update([prompts])
 
     async def put_video_frame(self, frame: av.VideoFrame):
+        if not self.video_ready:
+            self._put_passthrough_video(frame)
+            return
+
+        seq = self._video_seq
+        self._video_seq += 1
+
+        frame.side_data.seq = seq
         frame.side_data.input = self.video_preprocess(frame)
-        frame.side_data.skipped = True
-        self.client.put_video_input(frame)
-        await self.video_incoming_frames.put(frame)
+        if self.client.put_video_input(frame):
+            self.video_incoming_frames.add(seq, frame.pts, frame.time_base)
 
     async def put_audio_frame(self, frame: av.AudioFrame):
-        frame.side_data.input = self.audio_preprocess(frame)
-        frame.side_data.skipped = True
-        self.client.put_audio_input(frame)
+        frame.side_data.passthrough = not self.audio_ready
+        if not frame.side_data.passthrough:
+            frame.side_data.input = self.audio_preprocess(frame)
+            self.client.put_audio_input(frame)
         await self.audio_incoming_frames.put(frame)
 
-    def video_preprocess(self, frame: av.VideoFrame) -> Union[torch.Tensor, np.ndarray]:
-        frame_np = frame.to_ndarray(format="rgb24").astype(np.float32) / 255.0
-        return torch.from_numpy(frame_np).unsqueeze(0)
+    def video_preprocess(self, frame: av.VideoFrame) -> Union[torch.Tensor, YUV420Planes]:
+        # Color conversion and normalization are deferred to LoadTensor so dropped frames stay cheap
+        if frame.format.name == "yuv420p":
+            return yuv420p_planes(frame)
+        return torch.from_numpy(frame.to_ndarray(format="rgb24")).unsqueeze(0)
     
     def audio_preprocess(self, frame: av.AudioFrame) -> Union[torch.Tensor, np.ndarray]:
         return frame.to_ndarray().ravel().reshape(-1, 2).mean(axis=1).astype(np.int16)
     
     def video_postprocess(self, output: Union[torch.Tensor, np.ndarray]) -> av.VideoFrame:
-        return av.VideoFrame.from_ndarray(
-            (output * 255.0).clamp(0, 255).to(dtype=torch.uint8).squeeze(0).cpu().numpy()
-        )
+        # Produce the encoder's native yuv420p directly so it does not reformat the frame
+        planes = rgb_to_yuv420(output, self.client.buffer_pool)
+        frame = av.VideoFrame(planes[0].shape[1], planes[0].shape[0], "yuv420p")
+        for plane, data in zip(frame.planes, planes):
+            # Copy straight from the device into the frame memory, skipping the line padding
+            torch.from_numpy(plane_view(plane)).copy_(data)
+            self.client.buffer_pool.release(data)
+        return frame
 
     def audio_postprocess(self, output: Union[torch.Tensor, np.ndarray]) -> av.AudioFrame:
         return av.AudioFrame.from_ndarray(np.repeat(output, 2).reshape(1, -1))
     
     async def get_processed_video_frame(self):
-        # TODO: make it generic to support purely generative video cases
-        async with temporary_log_level("comfy", self._comfyui_inference_log_level):
-            out_tensor = await self.client.get_video_output()
-        frame = await self.video_incoming_frames.get()
-        while frame.side_data.skipped:
-            frame = await self.video_incoming_frames.get()
-
-        processed_frame  = self.video_postprocess(out_tensor)
-        processed_frame.pts = frame.pts
-        processed_frame.time_base = frame.time_base
+        while True:
+            while not self.video_ready or not self._video_passthrough.empty():
+                frame = await self._video_passthrough.get()
+                if frame is not None:
+                    self._last_video_timing = (frame.pts, frame.time_base)
+                    return frame
+
+            # TODO: make it generic to support purely generative video cases
+            async with temporary_log_level("comfy", self._comfyui_inference_log_level):
+                output = await self._get_stream_video_output()
+            # Without an output a warmup started, pass frames through until it is done
+            if output is not None:
+                break
+
+        seq, out_tensor = output
+
+        timing = self.video_incoming_frames.pop(seq) if seq is not None else None
+        if timing is None:
+            logger.debug(f"No pending frame for output sequence {seq}, reusing last timestamp")
+            timing = self._last_video_timing
+        self._last_video_timing = timing
+
+        processed_frame = self.video_postprocess(out_tensor)
+        self.client.release_video_output(out_tensor)
+        if timing is not None:
+            processed_frame.pts, processed_frame.time_base = timing
         
         return processed_frame
 
     async def get_processed_audio_frame(self):
         # TODO: make it generic to support purely generative audio cases and also add frame skipping
         frame = await self.audio_incoming_frames.get()
-        if frame.samples > len(self.processed_audio_buffer):
+        if frame.side_data.passthrough:
+            return frame
+
+        while frame.samples > len(self.processed_audio_buffer):
             async with temporary_log_level("comfy", self._comfyui_inference_log_level):
                 out_tensor = await self.client.get_audio_output()
-            self.processed_audio_buffer = np.concatenate([self.processed_audio_buffer, out_tensor])
-        out_data = self.processed_audio_buffer[:frame.samples]
-        self.processed_audio_buffer = self.processed_audio_buffer[frame.samples:]
+            self.processed_audio_buffer.write(out_tensor)
+
+        # Reuse the output array across frames, from_ndarray copies it into the frame
+        if len(self._audio_out) < frame.samples:
+            self._audio_out = np.empty(frame.samples, dtype=np.int16)
+        out_data = self.processed_audio_buffer.read(frame.samples, out=self._audio_out)
 
         processed_frame = self.audio_postprocess(out_data)
         processed_frame.pts = frame.pts
@@ -122,10 +299,33 @@ class Pipeline:
         
         return processed_frame
     
+    def get_output_drop_counts(self) -> Dict[str, int]:
+        """Get how many processed outputs were dropped because sending fell behind."""
+        return self.client.get_output_drop_counts()
+
+    def get_restart_counts(self) -> Dict[int, int]:
+        """Get how many times each prompt was restarted after a failure, keyed by prompt index."""
+        return self.client.get_restart_counts()
+
+    def get_inference_time(self) -> Optional[float]:
+        """Get the mean time the workflow spends on a video frame in seconds, if measured yet."""
+        return self.client.get_inference_time()
+
+    def get_node_timings(self) -> Dict[int, Dict[str, Any]]:
+        """Get rolling frame and per node latency statistics, keyed by prompt index."""
+        return self.client.get_node_timings()
+
     async def get_nodes_info(self) -> Dict[str, Any]:
         """Get information about all nodes in the current prompt including metadata."""
         nodes_info = await self.client.get_available_nodes()
         return nodes_info
     
     async def cleanup(self):
+        for warmup in (self._video_warmup, self._audio_warmup):
+            if warmup is not None and not warmup.done():
+                warmup.cancel()
         await self.client.cleanup()
+
+    async def close(self):
+        """Clean up and release the stream session, the pipeline cannot be used afterwards."""
+        await self.client.close()
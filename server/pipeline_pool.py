@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from comfystream.utils import prompt_hash
+from pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# Delay before retrying to fill a pool after warming a pipeline failed
+REFILL_RETRY_DELAY = 10.0
+
+Prompts = Union[Dict[Any, Any], List[Dict[Any, Any]]]
+
+
+class PipelinePool:
+    """Prewarmed pipelines of configured workflows that new streams can claim.
+
+    For every workflow and resolution added to the pool, ``size`` pipelines are kept
+    with their prompts running and their warmup done, so a stream claiming one skips
+    model loading and warmup. Pooled pipelines only join batch groups once claimed.
+    Claimed pipelines are replaced in the background.
+    """
+
+    def __init__(self, create_pipeline: Callable[[], Pipeline], size: int):
+        """Initializes the PipelinePool class.
+
+        Args:
+            create_pipeline: Creates a new pipeline on the shared model host.
+            size: The number of warm pipelines kept per workflow and resolution.
+        """
+        self._create_pipeline = create_pipeline
+        self.size = size
+        self._workflows: Dict[Tuple[str, int, int], Tuple[List[Dict[Any, Any]], int, int]] = {}
+        self._pipelines: Dict[Tuple[str, int, int], List[Pipeline]] = {}
+        self._fill_tasks: Dict[Tuple[str, int, int], asyncio.Task] = {}
+
+    @staticmethod
+    def _prompts_list(prompts: Prompts) -> List[Dict[Any, Any]]:
+        return prompts if isinstance(prompts, list) else [prompts]
+
+    def add_workflow(self, prompts: Prompts, width: int, height: int):
+        """Keep warm pipelines of a workflow at a resolution, filled once the pool is started."""
+        prompts = self._prompts_list(prompts)
+        key = (prompt_hash(prompts), width, height)
+        self._workflows[key] = (prompts, width, height)
+        self._pipelines.setdefault(key, [])
+
+    def start(self):
+        """Start filling the pool in the background."""
+        for key in self._workflows:
+            self._refill(key)
+
+    async def claim(self, prompts: Prompts) -> Optional[Pipeline]:
+        """Take a warm pipeline running the given prompts, if the pool has one."""
+        digest = prompt_hash(self._prompts_list(prompts))
+        for key, pipelines in self._pipelines.items():
+            if key[0] == digest and pipelines:
+                pipeline = pipelines.pop(0)
+                self._refill(key)
+                logger.info(f"Claimed a warm pipeline at {key[1]}x{key[2]}, {len(pipelines)} left")
+                await pipeline.set_batching(True)
+                return pipeline
+        return None
+
+    def _refill(self, key: Tuple[str, int, int]):
+        task = self._fill_tasks.get(key)
+        if task is None or task.done():
+            self._fill_tasks[key] = asyncio.create_task(self._fill(key))
+
+    async def _fill(self, key: Tuple[str, int, int]):
+        prompts, width, height = self._workflows[key]
+        while len(self._pipelines[key]) < self.size:
+            pipeline = self._create_pipeline()
+            pipeline.width = width
+            pipeline.height = height
+            try:
+                # Idle pipelines stay out of batch groups until they are claimed
+                await pipeline.set_batching(False)
+                await pipeline.set_prompts(prompts)
+                await pipeline.warm()
+            except asyncio.CancelledError:
+                await pipeline.close()
+                raise
+            except Exception as e:
+                logger.error(f"Error warming pooled pipeline, retrying in {REFILL_RETRY_DELAY}s: {str(e)}")
+                await pipeline.close()
+                await asyncio.sleep(REFILL_RETRY_DELAY)
+                continue
+            self._pipelines[key].append(pipeline)
+
+    async def close(self):
+        """Stop filling the pool and close the pipelines still in it."""
+        tasks: Set[asyncio.Task] = set(self._fill_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._fill_tasks.clear()
+
+        for pipelines in self._pipelines.values():
+            for pipeline in pipelines:
+                await pipeline.close()
+            pipelines.clear()
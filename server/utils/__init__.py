@@ -1,2 +1,4 @@
 from .utils import patch_loop_datagram, add_prefix_to_app_routes, temporary_log_level
 from .fps_meter import FPSMeter
+from .frame_store import PendingFrames
+from .admission import AdmissionController, SessionLoad
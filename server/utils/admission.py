@@ -0,0 +1,66 @@
+"""Admission control of new streams based on the measured cost of running streams."""
+
+from typing import Iterable, NamedTuple, Optional
+
+
+class SessionLoad(NamedTuple):
+    """Measured load of a running stream."""
+
+    fps: float
+    # Mean seconds the workflow spends on a frame of the stream, None until measured
+    inference_time: Optional[float]
+
+
+class AdmissionController:
+    """Decides whether a new stream can be accepted without degrading running streams.
+
+    Streams share the GPU, so a stream whose frames take ``t`` seconds each leaves the
+    others ``t`` seconds less per round. A new stream is estimated to cost the mean
+    inference time of the running streams, and is rejected if that would bring the
+    projected frame rate of a round below the FPS floor, or if running streams are
+    already below it.
+    """
+
+    def __init__(self, fps_floor: float = 0.0, max_sessions: Optional[int] = None):
+        """Initializes the AdmissionController class.
+
+        Args:
+            fps_floor: The output FPS running streams must keep, 0 to not check FPS.
+            max_sessions: The maximum number of concurrent streams, None for no limit.
+        """
+        self.fps_floor = fps_floor
+        self.max_sessions = max_sessions
+
+    def check(self, sessions: Iterable[SessionLoad]) -> Optional[str]:
+        """Check whether a new stream can be admitted.
+
+        Args:
+            sessions: The load of the running streams.
+
+        Returns:
+            None if the stream can be admitted, otherwise the reason it is rejected.
+        """
+        sessions = list(sessions)
+        if self.max_sessions is not None and len(sessions) >= self.max_sessions:
+            return f"Maximum of {self.max_sessions} concurrent streams reached"
+
+        if self.fps_floor <= 0 or not sessions:
+            return None
+
+        # Streams that have not produced output yet report 0 FPS and are not judged
+        slowest = min((session.fps for session in sessions if session.fps > 0), default=None)
+        if slowest is not None and slowest < self.fps_floor:
+            return f"Running streams are below {self.fps_floor:g} FPS ({slowest:.1f} FPS)"
+
+        inference_times = [session.inference_time for session in sessions if session.inference_time]
+        if not inference_times:
+            return None
+
+        round_time = sum(inference_times) + sum(inference_times) / len(inference_times)
+        projected_fps = 1.0 / round_time
+        if projected_fps < self.fps_floor:
+            return (
+                f"Accepting the stream would bring streams below {self.fps_floor:g} FPS "
+                f"(projected {projected_fps:.1f} FPS)"
+            )
+        return None
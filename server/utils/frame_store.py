@@ -0,0 +1,65 @@
+"""Bounded store of timing info for frames awaiting their processed output."""
+
+import logging
+from collections import OrderedDict
+from fractions import Fraction
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FrameTiming = Tuple[Optional[int], Optional[Fraction]]
+
+
+class PendingFrames:
+    """Maps frame sequence numbers to their timing info in arrival order.
+
+    Only the pts and time base are kept so the frames themselves can be released as
+    soon as they are dropped or consumed by the workflow. Entries older than the last
+    processed sequence are evicted on lookup and the store never exceeds ``maxlen``.
+    """
+
+    def __init__(self, maxlen: int = 30):
+        """Initializes the PendingFrames class.
+
+        Args:
+            maxlen: The maximum number of frames to keep timing info for.
+        """
+        self._maxlen = maxlen
+        self._frames: "OrderedDict[int, FrameTiming]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, seq: int, pts: Optional[int], time_base: Optional[Fraction]):
+        """Record the timing info of an incoming frame.
+
+        Args:
+            seq: The monotonically increasing sequence number of the frame.
+            pts: The presentation timestamp of the frame.
+            time_base: The time base of the frame.
+        """
+        self._frames[seq] = (pts, time_base)
+        if len(self._frames) > self._maxlen:
+            self._frames.popitem(last=False)
+
+    def pop(self, seq: int) -> Optional[FrameTiming]:
+        """Remove and return the timing info of a processed frame.
+
+        All frames older than ``seq`` are evicted since their outputs will never arrive.
+
+        Args:
+            seq: The sequence number of the processed frame.
+
+        Returns:
+            The pts and time base of the frame, or None if it is not in the store.
+        """
+        timing = self._frames.pop(seq, None)
+        while self._frames:
+            oldest = next(iter(self._frames))
+            if oldest > seq:
+                break
+            self._frames.popitem(last=False)
+        return timing
+
+    def clear(self):
+        self._frames.clear()
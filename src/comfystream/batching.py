@@ -0,0 +1,181 @@
+"""Batching of video frames from several stream sessions into one workflow execution.
+
+Sessions running the same workflow join a batch group. Their prompts are bound to the
+group instead of their own session, so ``LoadTensor`` collects frames from all members
+into a single batched image and ``SaveTensor`` scatters the batched result back to the
+output queue of each member.
+"""
+
+import time
+import threading
+
+from queue import Empty
+from typing import Any, Dict, List, Optional, Tuple
+
+from comfystream.tensor_cache import SessionClosed
+
+# Frames collected for one execution, as the channels of the member and the frame
+BatchFrames = List[Tuple[Any, Any]]
+
+DEFAULT_MAX_BATCH_WAIT = 0.005
+# Prefix of the session ids prompts bound to a batch group run under
+BATCH_GROUP_PREFIX = "batch-"
+
+
+class BatchGroup:
+    """Stream sessions whose frames are executed together.
+
+    A batch is started by the first available frame. The group then waits up to
+    ``max_wait`` seconds for frames of the other members, so batching adds at most
+    that much latency, and takes at most one frame per member and ``max_batch_size``
+    frames in total.
+    """
+
+    def __init__(self, group_id: str, max_batch_size: int, max_wait: float = DEFAULT_MAX_BATCH_WAIT):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.group_id = group_id
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.closed = False
+
+        self._members: Dict[str, Any] = {}
+        self._deferred: Dict[str, Any] = {}
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, channels):
+        with self._condition:
+            self._members[channels.session_id] = channels
+            self._condition.notify_all()
+
+    def remove(self, channels):
+        with self._condition:
+            self._members.pop(channels.session_id, None)
+            self._deferred.pop(channels.session_id, None)
+            self._condition.notify_all()
+
+    def close(self):
+        """Dissolve the group, workers collecting from it raise ``SessionClosed``."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def notify(self):
+        """Wake collecting workers, called after a frame is put in a member's input queue."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def defer(self, channels, frame):
+        """Hand a collected frame back so it starts the next batch, e.g. if its size differs."""
+        with self._condition:
+            self._deferred[channels.session_id] = frame
+            self._condition.notify_all()
+
+    def _take(self, batch: Dict[str, Tuple[Any, Any]]):
+        for session_id, channels in self._members.items():
+            if len(batch) >= self.max_batch_size:
+                return
+            if session_id in batch or channels.closed:
+                continue
+
+            frame = self._deferred.pop(session_id, None)
+            if frame is None:
+                try:
+                    frame = channels.image_inputs.get_nowait()
+                except Empty:
+                    continue
+            if frame is not None:
+                batch[session_id] = (channels, frame)
+
+    def collect(self) -> BatchFrames:
+        """Block until a batch of frames is available and take it.
+
+        Raises:
+            SessionClosed: If the group is dissolved before a frame is available.
+        """
+        batch: Dict[str, Tuple[Any, Any]] = {}
+        with self._condition:
+            while True:
+                if self.closed:
+                    raise SessionClosed(self.group_id)
+                self._take(batch)
+                if batch:
+                    break
+                self._condition.wait()
+
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < min(self.max_batch_size, len(self._members)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                self._take(batch)
+        return list(batch.values())
+
+    def start(self, batch: List[Tuple[Any, Optional[int]]]):
+        """Record the members and frame sequence numbers of the batch the calling worker runs."""
+        self._local.batch = batch
+        self._local.started_at = time.perf_counter()
+
+    def finish(self) -> Tuple[List[Tuple[Any, Optional[int]]], Optional[float]]:
+        """Get and forget the batch the calling worker runs.
+
+        Returns:
+            The batch and the seconds since the worker started it.
+        """
+        batch = getattr(self._local, "batch", [])
+        started_at = getattr(self._local, "started_at", None)
+        self._local.batch = []
+        self._local.started_at = None
+        return batch, time.perf_counter() - started_at if started_at is not None else None
+
+
+_groups: Dict[str, BatchGroup] = {}
+_groups_lock = threading.Lock()
+
+
+def is_batch_group_id(session_id: str) -> bool:
+    return session_id.startswith(BATCH_GROUP_PREFIX)
+
+
+def get_batch_group(group_id: str) -> Optional[BatchGroup]:
+    """Get a batch group by id.
+
+    Raises:
+        SessionClosed: If the id is of a batch group that was dissolved, e.g. when a
+            prompt bound to the group runs after its last member left.
+    """
+    group = _groups.get(group_id)
+    if group is None and is_batch_group_id(group_id):
+        raise SessionClosed(group_id)
+    return group
+
+
+def join_batch_group(
+    group_id: str, channels, max_batch_size: int, max_wait: float = DEFAULT_MAX_BATCH_WAIT
+) -> BatchGroup:
+    """Add a session to a batch group, creating the group if it does not exist.
+
+    The batch limits of an existing group are kept.
+    """
+    with _groups_lock:
+        group = _groups.get(group_id)
+        if group is None:
+            group = BatchGroup(group_id, max_batch_size, max_wait)
+            _groups[group_id] = group
+        group.add(channels)
+        return group
+
+
+def leave_batch_group(group: BatchGroup, channels):
+    """Remove a session from a batch group, dropping the group once it is empty."""
+    with _groups_lock:
+        group.remove(channels)
+        if not len(group) and _groups.get(group.group_id) is group:
+            del _groups[group.group_id]
+            group.close()
@@ -0,0 +1,77 @@
+"""Pool of reusable frame buffers to avoid per-frame tensor allocations."""
+
+import threading
+import torch
+
+from collections import defaultdict
+from torch.utils.weak import WeakIdKeyDictionary
+from typing import Dict, List, Optional, Tuple, Union
+
+BufferKey = Tuple[Tuple[int, ...], torch.dtype, str, bool]
+
+
+class FrameBufferPool:
+    """Recycles tensors keyed on shape, dtype and device.
+
+    Buffers are handed out by ``acquire`` and returned with ``release`` once their
+    contents are no longer needed. Only buffers created by the pool are recycled, so
+    releasing a tensor that is still owned by a workflow is a no-op. Buffers that are
+    never released are simply garbage collected.
+    """
+
+    def __init__(self, max_free_per_key: int = 4):
+        """Initializes the FrameBufferPool class.
+
+        Args:
+            max_free_per_key: The maximum number of idle buffers kept for each key.
+        """
+        self._max_free_per_key = max_free_per_key
+        self._free: Dict[BufferKey, List[torch.Tensor]] = defaultdict(list)
+        # Tensors compare elementwise, so ownership is tracked by identity
+        self._keys = WeakIdKeyDictionary()
+        self._lock = threading.Lock()
+
+    def acquire(
+        self,
+        shape: Union[torch.Size, Tuple[int, ...]],
+        dtype: torch.dtype,
+        device: Optional[Union[str, torch.device]] = None,
+        pin_memory: bool = False,
+    ) -> torch.Tensor:
+        """Get a buffer with undefined contents.
+
+        Args:
+            shape: The shape of the buffer.
+            dtype: The dtype of the buffer.
+            device: The device of the buffer. Defaults to the CPU.
+            pin_memory: Whether a CPU buffer should be page-locked for faster device copies.
+                Ignored when CUDA is unavailable.
+        """
+        device = torch.device(device or "cpu")
+        pin_memory = pin_memory and device.type == "cpu" and torch.cuda.is_available()
+        key = (tuple(shape), dtype, str(device), pin_memory)
+
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+
+        buffer = torch.empty(key[0], dtype=dtype, device=device, pin_memory=pin_memory)
+        with self._lock:
+            self._keys[buffer] = key
+        return buffer
+
+    def release(self, buffer: torch.Tensor):
+        """Return a buffer to the pool so it can be reused."""
+        with self._lock:
+            key = self._keys.get(buffer)
+            if key is None:
+                return
+            free = self._free[key]
+            if len(free) < self._max_free_per_key and not any(b is buffer for b in free):
+                free.append(buffer)
+
+    def clear(self):
+        """Drop all idle buffers."""
+        with self._lock:
+            self._free.clear()
@@ -1,30 +1,161 @@
 import asyncio
-from typing import List
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
 import logging
 
-from comfystream import tensor_cache
-from comfystream.utils import convert_prompt
+from comfystream import batching, tensor_cache
+from comfystream.execution import ExecutionPlan, UnsupportedPromptError
+from comfystream.frame_drop import FrameDropPolicy, create_frame_drop_policy, put_latest
+from comfystream.graph import diff_prompts
+from comfystream.model_host import ModelHost
+from comfystream.node_metadata import node_metadata_index
+from comfystream.prompt_updates import PromptUpdateCoalescer, resolve
+from comfystream.reorder import ReorderBuffer
+from comfystream.timing import PromptTimings
+from comfystream.utils import convert_prompt, prompt_hash, release_session_prompts
 
 from comfy.api.components.schema.prompt import PromptDictInput
-from comfy.cli_args_types import Configuration
-from comfy.client.embedded_comfy_client import EmbeddedComfyClient
 
 logger = logging.getLogger(__name__)
 
+# "queue" runs every frame through EmbeddedComfyClient.queue_prompt, "compiled" runs a
+# compiled execution plan per frame and falls back to queueing for unsupported prompts
+EXECUTION_MODES = ["queue", "compiled"]
+
+# Prompts with audio nodes are never batched or run by several workers, only video frames are
+AUDIO_NODE_CLASS_TYPES = ["LoadAudioTensor", "SaveAudioTensor"]
+
+# Delay before restarting a failed prompt runner, doubled for every consecutive failure
+RESTART_BACKOFF_INITIAL = 0.1
+RESTART_BACKOFF_MAX = 5.0
+# Consecutive failures after which a prompt is considered broken and the client torn down
+MAX_CONSECUTIVE_FAILURES = 10
+
+
+def has_audio_nodes(prompt: PromptDictInput) -> bool:
+    return any(node.get("class_type") in AUDIO_NODE_CLASS_TYPES for node in prompt.values())
+
 
 class ComfyStreamClient:
-    def __init__(self, max_workers: int = 1, **kwargs):
-        config = Configuration(**kwargs)
-        self.comfy_client = EmbeddedComfyClient(config, max_workers=max_workers)
+    def __init__(
+        self,
+        max_workers: int = 1,
+        session_id: Optional[str] = None,
+        frame_drop_policy: Union[str, FrameDropPolicy, None] = None,
+        max_video_outputs: int = tensor_cache.DEFAULT_MAX_VIDEO_OUTPUTS,
+        max_audio_outputs: int = tensor_cache.DEFAULT_MAX_AUDIO_OUTPUTS,
+        execution_mode: str = "queue",
+        model_host: Optional[ModelHost] = None,
+        max_batch_size: int = 1,
+        max_batch_wait: float = batching.DEFAULT_MAX_BATCH_WAIT,
+        **kwargs,
+    ):
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{execution_mode}', expected one of {EXECUTION_MODES}")
+
+        # A shared host keeps its models loaded for other streams, a client without one
+        # owns its embedded client and stops it on cleanup
+        self._owns_model_host = model_host is None
+        self.model_host = model_host if model_host is not None else ModelHost(max_workers=max_workers, **kwargs)
+        self.comfy_client = self.model_host.comfy_client
+        self.max_workers = max_workers
         self.running_prompts = {} # To be used for cancelling tasks
         self.current_prompts = []
         self.cleanup_lock = asyncio.Lock()
+        self._prompt_updates: PromptUpdateCoalescer[List[PromptDictInput]] = PromptUpdateCoalescer()
+
+        self.execution_mode = execution_mode
+        # Prompt and its compiled plan keyed by prompt index, the plan is None when
+        # the prompt cannot be compiled and has to be queued
+        self._compiled_prompts: Dict[int, Tuple[Any, Optional[ExecutionPlan]]] = {}
+        self._plan_executor = ThreadPoolExecutor(thread_name_prefix="comfystream-plan")
+        self._compile_lock = asyncio.Lock()
+
+        # Each client streams through its own channels so several can share a process
+        self.session_id = session_id or uuid.uuid4().hex
+        self.channels = tensor_cache.get_channels(self.session_id)
+        self.set_frame_drop_policy(frame_drop_policy)
+        self.channels.image_outputs.maxsize = max_video_outputs
+        self.channels.audio_outputs.maxsize = max_audio_outputs
+        # Batches of a group run on the runners of all its members, so several of them
+        # can hold frames of this session at once
+        self._reorder_buffer = ReorderBuffer(
+            self.channels.in_flight, max_pending=2 * max_workers * max(max_batch_size, 1)
+        )
+
+        # Number of times each prompt's runners were restarted after a failure
+        self.restart_counts: Dict[int, int] = {}
+        # Rolling latency of frames and of each node per prompt index
+        self.prompt_timings: Dict[int, PromptTimings] = {}
+
+        # Above 1, clients running the same video workflow execute their frames in batches
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self._batch_group: Optional[batching.BatchGroup] = None
+        self._batching_enabled = True
+        # Prompts as given, to rebind them when batching is enabled or disabled
+        self._prompts: List[PromptDictInput] = []
+
+    def set_frame_drop_policy(self, policy: Union[str, FrameDropPolicy, None] = None, **kwargs):
+        """Select how video input frames are dropped when the workflow falls behind."""
+        self.channels.frame_drop_policy = create_frame_drop_policy(policy, **kwargs)
+
+    def get_output_drop_counts(self) -> Dict[str, int]:
+        """Get how many outputs were dropped because the consumer fell behind.
+
+        Returns:
+            The number of dropped video frames and dropped audio samples.
+        """
+        return {
+            "video_frames": self.channels.image_outputs.dropped,
+            "audio_samples": self.channels.audio_outputs.dropped,
+        }
+
+    @property
+    def buffer_pool(self):
+        """Reusable frame buffers of this client's session."""
+        return self.channels.buffer_pool
+
+    def _bind_prompts(self, prompts: List[PromptDictInput]) -> str:
+        """Join the batch group of the prompts if they can be batched.
+
+        Returns:
+            The session id to bind the prompts to, the id of the batch group or the
+            client's own session id.
+        """
+        group_id = None
+        audio = any(has_audio_nodes(prompt) for prompt in prompts)
+        if self.max_batch_size > 1 and self._batching_enabled and not audio:
+            digest = prompt_hash(prompts)
+            if digest is not None:
+                group_id = f"{batching.BATCH_GROUP_PREFIX}{digest}"
+
+        if self._batch_group is not None and self._batch_group.group_id != group_id:
+            batching.leave_batch_group(self._batch_group, self.channels)
+            self._batch_group = None
+        if group_id is not None and self._batch_group is None:
+            self._batch_group = batching.join_batch_group(
+                group_id, self.channels, self.max_batch_size, self.max_batch_wait
+            )
+        return group_id or self.session_id
 
     async def set_prompts(self, prompts: List[PromptDictInput]):
-        self.current_prompts = [convert_prompt(prompt) for prompt in prompts]
-        for idx in range(len(self.current_prompts)):
-            task = asyncio.create_task(self.run_prompt(idx))
-            self.running_prompts[idx] = task
+        # Runners of replaced prompts would keep holding their workers, and a pending
+        # update of the replaced prompts must not be applied on top of the new ones
+        await self._cancel_runners()
+        self._prompt_updates.discard()
+        self._prompts = prompts
+        session_id = self._bind_prompts(prompts)
+        self.current_prompts = [convert_prompt(prompt, session_id) for prompt in prompts]
+        for idx, prompt in enumerate(self.current_prompts):
+            # One runner per worker keeps that many frames of each prompt in flight. Audio
+            # outputs are not reordered and its nodes buffer samples, so it runs serially.
+            workers = 1 if has_audio_nodes(prompt) else self.max_workers
+            for worker in range(workers):
+                task = asyncio.create_task(self.run_prompt(idx))
+                self.running_prompts[(idx, worker)] = task
 
     async def update_prompts(self, prompts: List[PromptDictInput]):
         # TODO: currently under the assumption that only already running prompts are updated
@@ -32,65 +163,262 @@ class ComfyStreamClient:
             raise ValueError(
                 "Number of updated prompts must match the number of currently running prompts."
             )
-        self.current_prompts = [convert_prompt(prompt) for prompt in prompts]
+        self._prompts = prompts
+        session_id = self._bind_prompts(prompts)
+        updated_prompts = []
+        for current, prompt in zip(self.current_prompts, prompts):
+            prompt = convert_prompt(prompt, session_id)
+            # Keep the running prompt if nothing changed so its compiled plan stays in use
+            updated_prompts.append(prompt if diff_prompts(current, prompt) else current)
+        self.current_prompts = updated_prompts
+
+    async def set_batching(self, enabled: bool):
+        """Let the prompts join batch groups, or keep them on the client's own session.
+
+        Idle clients, such as pooled ones, are kept out of batch groups since every batch
+        would wait for frames of members that never get any.
+        """
+        if enabled == self._batching_enabled:
+            return
+        self._batching_enabled = enabled
+        if self._prompts:
+            await self.update_prompts(self._prompts)
+
+    async def submit_prompt_update(self, prompts: List[PromptDictInput]) -> bool:
+        """Update the running prompts at the next frame boundary.
+
+        Updates submitted while another is still pending replace it, so only the latest
+        of a burst of updates is converted and applied. When no frame is being processed,
+        e.g. without input frames or once the runners stopped, no boundary is coming and
+        the update is applied right away.
+
+        Returns:
+            True once the update is applied, False if it was superseded by a newer one or
+            discarded because new prompts were set.
+        """
+        if len(prompts) != len(self.current_prompts):
+            raise ValueError(
+                "Number of updated prompts must match the number of currently running prompts."
+            )
+        future = self._prompt_updates.submit(prompts)
+        if not self._processing_frame():
+            await self._apply_prompt_update()
+        return await asyncio.shield(future)
+
+    def _processing_frame(self) -> bool:
+        running = any(not task.done() for task in self.running_prompts.values())
+        return running and self.channels.in_flight.oldest() is not None
+
+    async def _apply_prompt_update(self):
+        pending = self._prompt_updates.take()
+        if pending is None:
+            return
+
+        prompts, future = pending
+        try:
+            await self.update_prompts(prompts)
+        except Exception as e:
+            logger.error(f"Error updating prompts: {str(e)}")
+            resolve(future, exception=e)
+        else:
+            resolve(future, True)
 
     async def run_prompt(self, prompt_index: int):
+        """Execute a prompt frame after frame, restarting it when it fails.
+
+        A failed frame is dropped and the prompt is retried with exponential backoff,
+        keeping the embedded client and its loaded models alive. Only a prompt that keeps
+        failing tears the client down.
+        """
+        failures = 0
         while True:
             try:
-                await self.comfy_client.queue_prompt(self.current_prompts[prompt_index])
+                await self.execute_prompt(prompt_index)
+                failures = 0
             except Exception as e:
-                await self.cleanup()
-                logger.error(f"Error running prompt: {str(e)}")
-                raise
+                failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    logger.error(f"Error running prompt, giving up after {failures} consecutive failures: {str(e)}")
+                    await self.cleanup()
+                    raise
+
+                self.restart_counts[prompt_index] = self.restart_counts.get(prompt_index, 0) + 1
+                delay = min(RESTART_BACKOFF_INITIAL * 2 ** (failures - 1), RESTART_BACKOFF_MAX)
+                logger.error(f"Error running prompt, restarting in {delay:.2f}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+    def get_restart_counts(self) -> Dict[int, int]:
+        """Get how many times each prompt was restarted after a failure, keyed by prompt index."""
+        return dict(self.restart_counts)
+
+    def get_node_timings(self) -> Dict[int, Dict[str, Any]]:
+        """Get rolling latency statistics of each prompt, keyed by prompt index.
+
+        Whole frames and their nodes are timed in both execution modes, in queue mode
+        from the progress events of the ComfyUI executor. Nodes whose output the executor
+        reuses from its cache are not timed. The times of whole frames and of the stream
+        input nodes include waiting for the next input.
+        """
+        return {prompt_index: timings.snapshot() for prompt_index, timings in self.prompt_timings.items()}
+
+    def get_inference_time(self) -> Optional[float]:
+        """Get the mean time the workflow spends on a video frame of this session in seconds.
+
+        Measured from LoadTensor taking a frame to SaveTensor producing its output, a
+        batched frame costs its share of the batch. None until a frame was processed.
+        """
+        return self.channels.inference_latency.mean()
+
+    async def execute_prompt(self, prompt_index: int):
+        """Execute a prompt once, processing one frame."""
+        await self._apply_prompt_update()
+        prompt = self.current_prompts[prompt_index]
+        timings = self.prompt_timings.get(prompt_index)
+        if timings is None:
+            timings = self.prompt_timings[prompt_index] = PromptTimings()
+        if self.execution_mode == "compiled":
+            loop = asyncio.get_running_loop()
+            async with self._compile_lock:
+                compiled = self._compiled_prompts.get(prompt_index)
+                if compiled is None or compiled[0] is not prompt:
+                    # New or updated prompt, carry over what is still valid from the previous plan
+                    previous = compiled[1] if compiled is not None else None
+                    await self.model_host.start()
+                    plan = await loop.run_in_executor(self._plan_executor, self._compile_prompt, prompt, previous)
+                    self._compiled_prompts[prompt_index] = (prompt, plan)
+                else:
+                    plan = compiled[1]
+
+            if plan is not None:
+                started_at = time.perf_counter()
+                await loop.run_in_executor(self._plan_executor, plan.run, timings)
+                timings.record_frame(time.perf_counter() - started_at)
+                return
+
+        # Nodes run inside the ComfyUI executor here and are timed from its progress events
+        prompt_id = uuid.uuid4().hex
+        self.model_host.node_timer.watch(prompt_id, prompt, timings)
+        try:
+            started_at = time.perf_counter()
+            await self.comfy_client.queue_prompt(prompt, prompt_id=prompt_id)
+            timings.record_frame(time.perf_counter() - started_at)
+        finally:
+            self.model_host.node_timer.unwatch(prompt_id)
+
+    def _compile_prompt(self, prompt, previous: Optional[ExecutionPlan] = None) -> Optional[ExecutionPlan]:
+        try:
+            # Node classes are only re-imported when node packages changed
+            plan = ExecutionPlan(prompt, node_metadata_index.node_classes, previous)
+        except UnsupportedPromptError as e:
+            logger.warning(f"Prompt cannot be compiled, falling back to queueing it per frame: {e}")
+            return None
+
+        # Evaluate the constant subgraph before streaming so frames never wait on model loads
+        logger.info(f"Precomputing constant nodes {plan.recomputed_nodes}")
+        plan.precompute()
+        return plan
+
+    async def _cancel_runners(self):
+        # A runner giving up cleans up from its own task, which must not await itself
+        current_task = asyncio.current_task()
+        tasks_to_cancel = [task for task in self.running_prompts.values() if task is not current_task]
+        for task in tasks_to_cancel:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.running_prompts.clear()
 
     async def cleanup(self):
         async with self.cleanup_lock:
-            tasks_to_cancel = list(self.running_prompts.values())
-            for task in tasks_to_cancel:
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-            self.running_prompts.clear()
-
-            if self.comfy_client.is_running:
-                try:
-                    await self.comfy_client.__aexit__()
-                except Exception as e:
-                    logger.error(f"Error during ComfyClient cleanup: {e}")
+            await self._cancel_runners()
+            self._compiled_prompts.clear()
+            self.restart_counts.clear()
+            self.prompt_timings.clear()
+            self._prompt_updates.discard()
 
+            if self._batch_group is not None:
+                batching.leave_batch_group(self._batch_group, self.channels)
+                self._batch_group = None
+
+            if self._owns_model_host:
+                await self.model_host.stop()
 
             await self.cleanup_queues()
             logger.info("Client cleanup complete")
 
+    async def close(self):
+        """Clean up and release the session of this client, it cannot be used afterwards."""
+        await self.cleanup()
+        # Nodes still waiting for input of the session would hold their worker forever
+        self.channels.close()
+        self._plan_executor.shutdown(wait=False)
+        tensor_cache.remove_channels(self.session_id)
+        release_session_prompts(self.session_id)
+
         
     async def cleanup_queues(self):
-        while not tensor_cache.image_inputs.empty():
-            tensor_cache.image_inputs.get()
+        self.channels.clear_inputs()
+
+        while not self.channels.image_outputs.empty():
+            await self.channels.image_outputs.get()
+
+        self.channels.in_flight.clear()
+        self._reorder_buffer.clear()
+        self.channels.buffer_pool.clear()
+
+        while not self.channels.audio_outputs.empty():
+            await self.channels.audio_outputs.get()
+
+    def put_video_input(self, frame, droppable: bool = True) -> bool:
+        """Queue a video frame for the workflow.
+
+        Args:
+            frame: The frame to queue.
+            droppable: Whether the frame drop policy may drop the frame. Frames that
+                must be processed, such as warmup frames, bypass the policy.
+
+        Returns:
+            True if the frame was queued, False if it was dropped.
+        """
+        if not droppable:
+            put_latest(self.channels.image_inputs, frame)
+            queued = True
+        else:
+            queued = self.channels.frame_drop_policy.put(self.channels.image_inputs, frame)
+        if queued and self._batch_group is not None:
+            self._batch_group.notify()
+        return queued
+    
+    def put_audio_input(self, frame):
+        self.channels.audio_inputs.put(frame)
 
-        while not tensor_cache.audio_inputs.empty():
-            tensor_cache.audio_inputs.get()
+    async def get_video_output(self):
+        _, output = await self.get_sequenced_video_output()
+        return output
 
-        while not tensor_cache.image_outputs.empty():
-            await tensor_cache.image_outputs.get()
+    def release_video_output(self, output):
+        """Return a consumed video output to the buffer pool for reuse."""
+        self.channels.buffer_pool.release(output)
 
-        while not tensor_cache.audio_outputs.empty():
-            await tensor_cache.audio_outputs.get()
+    async def get_sequenced_video_output(self) -> Tuple[Optional[int], Any]:
+        """Get the next video output with the sequence number of its input frame.
 
-    def put_video_input(self, frame):
-        if tensor_cache.image_inputs.full():
-            tensor_cache.image_inputs.get(block=True)
-        tensor_cache.image_inputs.put(frame)
-    
-    def put_audio_input(self, frame):
-        tensor_cache.audio_inputs.put(frame)
+        With several workers or in a batch group, outputs that finish ahead of older
+        frames are held back so outputs are returned in input order.
+        """
+        if self.max_workers == 1 and self._batch_group is None:
+            return await self.channels.image_outputs.get()
 
-    async def get_video_output(self):
-        return await tensor_cache.image_outputs.get()
+        while True:
+            ready = self._reorder_buffer.pop()
+            if ready is not None:
+                return ready
+            self._reorder_buffer.push(*await self.channels.image_outputs.get())
     
     async def get_audio_output(self):
-        return await tensor_cache.audio_outputs.get()
+        return await self.channels.audio_outputs.get()
 
     async def get_available_nodes(self):
         """Get metadata and available nodes info in a single pass"""
@@ -99,118 +427,42 @@ class ComfyStreamClient:
             return {}
 
         try:
-            from comfy.nodes.package import import_all_nodes_in_workspace
-            nodes = import_all_nodes_in_workspace()
-
             all_prompts_nodes_info = {}
             
             for prompt_index, prompt in enumerate(self.current_prompts):
-                # Get set of class types we need metadata for, excluding LoadTensor and SaveTensor
-                needed_class_types = {
-                    node.get('class_type') 
-                    for node in prompt.values()
-                }
-                remaining_nodes = {
-                    node_id 
-                    for node_id, node in prompt.items() 
-                }
                 nodes_info = {}
 
-                # Only process nodes until we've found all the ones we need
-                for class_type, node_class in nodes.NODE_CLASS_MAPPINGS.items():
-                    if not remaining_nodes:  # Exit early if we've found all needed nodes
-                        break
-
-                    if class_type not in needed_class_types:
+                for node_id, node in prompt.items():
+                    class_type = node.get('class_type')
+                    input_info = node_metadata_index.get(class_type)
+                    if input_info is None:
                         continue
 
-                    # Get metadata for this node type (same as original get_node_metadata)
-                    input_data = node_class.INPUT_TYPES() if hasattr(node_class, 'INPUT_TYPES') else {}
-                    input_info = {}
-
-                    # Process required inputs
-                    if 'required' in input_data:
-                        for name, value in input_data['required'].items():
-                            if isinstance(value, tuple):
-                                if len(value) == 1 and isinstance(value[0], list):
-                                    # Handle combo box case where value is ([option1, option2, ...],)
-                                    input_info[name] = {
-                                        'type': 'combo',
-                                        'value': value[0],  # The list of options becomes the value
-                                    }
-                                elif len(value) == 2:
-                                    input_type, config = value
-                                    input_info[name] = {
-                                        'type': input_type,
-                                        'required': True,
-                                        'min': config.get('min', None),
-                                        'max': config.get('max', None),
-                                        'widget': config.get('widget', None)
-                                    }
-                                elif len(value) == 1:
-                                    # Handle simple type case like ('IMAGE',)
-                                    input_info[name] = {
-                                        'type': value[0]
-                                    }
-                            else:
-                                logger.error(f"Unexpected structure for required input {name}: {value}")
-
-                    # Process optional inputs with same logic
-                    if 'optional' in input_data:
-                        for name, value in input_data['optional'].items():
-                            if isinstance(value, tuple):
-                                if len(value) == 1 and isinstance(value[0], list):
-                                    # Handle combo box case where value is ([option1, option2, ...],)
-                                    input_info[name] = {
-                                        'type': 'combo',
-                                        'value': value[0],  # The list of options becomes the value
-                                    }
-                                elif len(value) == 2:
-                                    input_type, config = value
-                                    input_info[name] = {
-                                        'type': input_type,
-                                        'required': False,
-                                        'min': config.get('min', None),
-                                        'max': config.get('max', None),
-                                        'widget': config.get('widget', None)
-                                    }
-                                elif len(value) == 1:
-                                    # Handle simple type case like ('IMAGE',)
-                                    input_info[name] = {
-                                        'type': value[0]
-                                    }
-                            else:
-                                logger.error(f"Unexpected structure for optional input {name}: {value}")
-
-                    # Now process any nodes in our prompt that use this class_type
-                    for node_id in list(remaining_nodes):
-                        node = prompt[node_id]
-                        if node.get('class_type') != class_type:
-                            continue
-
-                        node_info = {
-                            'class_type': class_type,
-                            'inputs': {}
-                        }
-
-                        if 'inputs' in node:
-                            for input_name, input_value in node['inputs'].items():
-                                input_metadata = input_info.get(input_name, {})
-                                node_info['inputs'][input_name] = {
-                                    'value': input_value,
-                                    'type': input_metadata.get('type', 'unknown'),
-                                    'min': input_metadata.get('min', None),
-                                    'max': input_metadata.get('max', None),
-                                    'widget': input_metadata.get('widget', None)
-                                }
-                                # For combo type inputs, include the list of options
-                                if input_metadata.get('type') == 'combo':
-                                    node_info['inputs'][input_name]['value'] = input_metadata.get('value', [])
-
-                        nodes_info[node_id] = node_info
-                        remaining_nodes.remove(node_id)
-
-                    all_prompts_nodes_info[prompt_index] = nodes_info
+                    node_info = {
+                        'class_type': class_type,
+                        'inputs': {}
+                    }
+
+                    if 'inputs' in node:
+                        for input_name, input_value in node['inputs'].items():
+                            # The session binding is internal and not user editable
+                            if input_name == 'session_id':
+                                continue
+                            input_metadata = input_info.get(input_name, {})
+                            node_info['inputs'][input_name] = {
+                                'value': input_value,
+                                'type': input_metadata.get('type', 'unknown'),
+                                'min': input_metadata.get('min', None),
+                                'max': input_metadata.get('max', None),
+                                'widget': input_metadata.get('widget', None)
+                            }
+                            # For combo type inputs, include the list of options
+                            if input_metadata.get('type') == 'combo':
+                                node_info['inputs'][input_name]['value'] = input_metadata.get('value', [])
+
+                    nodes_info[node_id] = node_info
+
+                all_prompts_nodes_info[prompt_index] = nodes_info
 
             return all_prompts_nodes_info
 
@@ -0,0 +1,177 @@
+"""Streaming execution of converted prompts without per-frame queueing overhead.
+
+``EmbeddedComfyClient.queue_prompt`` validates, schedules and records history for the
+whole prompt on every call. For streaming, a prompt is instead compiled once into an
+``ExecutionPlan``: node instances in topological order with their constant inputs
+resolved. Nodes that do not depend on the stream inputs are evaluated once up front and
+their outputs pinned, so each frame only runs the frame-dependent part of the graph.
+"""
+
+import time
+import logging
+import torch
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from comfystream.graph import diff_prompts, find_constant_nodes, is_link, to_builtin, topological_order
+from comfystream.timing import PromptTimings
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedPromptError(Exception):
+    """Raised when a prompt uses node features that require the ComfyUI executor."""
+
+
+class PlanNode:
+    """A node instance with its inputs resolved for repeated execution."""
+
+    def __init__(self, node_id: str, node: Dict[str, Any], node_class: type, prompt: Dict[str, Any]):
+        self.node_id = node_id
+        self.class_type = node["class_type"]
+
+        if getattr(node_class, "INPUT_IS_LIST", False):
+            raise UnsupportedPromptError(f"{self.class_type} takes list inputs")
+        if any(getattr(node_class, "OUTPUT_IS_LIST", ()) or ()):
+            raise UnsupportedPromptError(f"{self.class_type} returns list outputs")
+
+        self.instance = node_class()
+        self.function = getattr(self.instance, node_class.FUNCTION)
+
+        self.constant_inputs: Dict[str, Any] = {}
+        self.linked_inputs: Dict[str, Tuple[str, int]] = {}
+        for name, value in node.get("inputs", {}).items():
+            if is_link(value):
+                self.linked_inputs[name] = (value[0], value[1])
+            else:
+                self.constant_inputs[name] = value
+
+        input_types = node_class.INPUT_TYPES() if hasattr(node_class, "INPUT_TYPES") else {}
+        for name, hidden_type in input_types.get("hidden", {}).items():
+            if hidden_type == "PROMPT":
+                self.constant_inputs[name] = prompt
+            elif hidden_type == "UNIQUE_ID":
+                self.constant_inputs[name] = node_id
+            elif hidden_type == "EXTRA_PNGINFO":
+                self.constant_inputs[name] = None
+            else:
+                raise UnsupportedPromptError(f"{self.class_type} requires hidden input {hidden_type}")
+
+    def execute(self, outputs: Dict[str, Tuple[Any, ...]]) -> Tuple[Any, ...]:
+        """Run the node with the outputs of the nodes it links to."""
+        kwargs = dict(self.constant_inputs)
+        for name, (source_id, index) in self.linked_inputs.items():
+            kwargs[name] = outputs[source_id][index]
+
+        result = self.function(**kwargs)
+        if isinstance(result, dict):
+            if "expand" in result:
+                raise UnsupportedPromptError(f"{self.class_type} expands into a subgraph")
+            result = result.get("result", ())
+        if result is None:
+            return ()
+        return result
+
+
+class ExecutionPlan:
+    """A compiled prompt that can be executed once per frame.
+
+    The constant subgraph is evaluated once by ``precompute`` and its outputs are pinned
+    for the lifetime of the plan. When a plan is compiled from an updated prompt, only
+    the nodes invalidated by the update get new instances. Every other node keeps its
+    warm instance and, if constant, its pinned outputs from the previous plan.
+    """
+
+    def __init__(self, prompt: Any, node_classes: Mapping[str, type], previous: Optional["ExecutionPlan"] = None):
+        """Compile a converted prompt.
+
+        Args:
+            prompt: The converted prompt.
+            node_classes: Node classes keyed by class type, i.e. ``NODE_CLASS_MAPPINGS``.
+            previous: The plan of the prompt this one replaces, to reuse its nodes and outputs.
+
+        Raises:
+            UnsupportedPromptError: If a node needs features only the ComfyUI executor provides.
+        """
+        self.prompt = prompt
+        self.graph = to_builtin(prompt)
+
+        for node_id, node in self.graph.items():
+            if node.get("class_type") not in node_classes:
+                raise UnsupportedPromptError(f"Unknown node type {node.get('class_type')} for node {node_id}")
+
+        try:
+            order = topological_order(self.graph)
+        except ValueError as e:
+            raise UnsupportedPromptError(str(e)) from e
+
+        previous_nodes: Dict[str, PlanNode] = {}
+        previous_outputs: Dict[str, Tuple[Any, ...]] = {}
+        self.diff = None
+        if previous is not None:
+            self.diff = diff_prompts(previous.graph, self.graph)
+            previous_nodes = {
+                node.node_id: node
+                for node in previous.constant_nodes + previous.frame_nodes
+                if node.node_id not in self.diff.invalidated
+            }
+            previous_outputs = {
+                node_id: outputs
+                for node_id, outputs in (previous._constant_outputs or {}).items()
+                if node_id in previous_nodes
+            }
+
+        nodes = []
+        for node_id in order:
+            node = previous_nodes.get(node_id)
+            if node is None:
+                node = PlanNode(node_id, self.graph[node_id], node_classes[self.graph[node_id]["class_type"]], self.graph)
+            nodes.append(node)
+
+        constant_node_ids = find_constant_nodes(self.graph)
+        self.constant_nodes = [node for node in nodes if node.node_id in constant_node_ids]
+        self.frame_nodes = [node for node in nodes if node.node_id not in constant_node_ids]
+        self._constant_outputs: Optional[Dict[str, Tuple[Any, ...]]] = None
+        self._reused_outputs = {
+            node_id: outputs for node_id, outputs in previous_outputs.items() if node_id in constant_node_ids
+        }
+
+    @property
+    def recomputed_nodes(self) -> List[str]:
+        """Ids of the constant nodes that are evaluated rather than carried over."""
+        return [node.node_id for node in self.constant_nodes if node.node_id not in self._reused_outputs]
+
+    def precompute(self):
+        """Evaluate the constant subgraph and pin its outputs. Does nothing if already done."""
+        if self._constant_outputs is not None:
+            return
+
+        with torch.inference_mode():
+            constant_outputs = {}
+            for node in self.constant_nodes:
+                if node.node_id in self._reused_outputs:
+                    constant_outputs[node.node_id] = self._reused_outputs[node.node_id]
+                else:
+                    constant_outputs[node.node_id] = node.execute(constant_outputs)
+        self._constant_outputs = constant_outputs
+        self._reused_outputs = {}
+
+    def run(self, timings: Optional[PromptTimings] = None):
+        """Execute the frame-dependent nodes for one frame.
+
+        Blocks until the stream input nodes receive a frame, so it should be called from a
+        worker thread.
+
+        Args:
+            timings: Records the execution time of each node if given.
+        """
+        self.precompute()
+        with torch.inference_mode():
+            outputs = dict(self._constant_outputs)
+            for node in self.frame_nodes:
+                if timings is None:
+                    outputs[node.node_id] = node.execute(outputs)
+                    continue
+                started_at = time.perf_counter()
+                outputs[node.node_id] = node.execute(outputs)
+                timings.record_node(node.node_id, node.class_type, time.perf_counter() - started_at)
@@ -0,0 +1,160 @@
+"""Policies deciding which incoming video frames reach the workflow."""
+
+import time
+import logging
+
+from abc import ABC, abstractmethod
+from queue import Queue, Full, Empty
+from typing import Any, Dict, Optional, Type, Union
+
+logger = logging.getLogger(__name__)
+
+
+def put_latest(queue: Queue, frame: Any):
+    """Put a frame in a bounded queue, evicting the oldest queued frame if full.
+
+    Never blocks, so it is safe to call from the event loop while the workflow
+    concurrently consumes the queue from a worker thread.
+    """
+    while True:
+        try:
+            queue.put_nowait(frame)
+            return
+        except Full:
+            try:
+                queue.get_nowait()
+            except Empty:
+                pass
+
+
+class FrameDropPolicy(ABC):
+    """Base class for video input frame drop policies.
+
+    ``put`` is called on the event loop for every incoming frame. The inference
+    hooks are called by the tensor nodes from the ComfyUI worker thread when a
+    frame is dequeued and when its output is produced.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def put(self, queue: Queue, frame: Any) -> bool:
+        """Enqueue the frame or drop it.
+
+        Returns:
+            True if the frame was enqueued, False if it was dropped.
+        """
+
+    def on_inference_start(self):
+        pass
+
+    def on_inference_end(self):
+        pass
+
+
+class LatestWinsPolicy(FrameDropPolicy):
+    """Always enqueue the newest frame, replacing any frame still waiting."""
+
+    name = "latest"
+
+    def put(self, queue: Queue, frame: Any) -> bool:
+        put_latest(queue, frame)
+        return True
+
+
+class SkipEveryNthPolicy(FrameDropPolicy):
+    """Drop every nth incoming frame and enqueue the rest latest-wins.
+
+    With the default of 2 every other frame is skipped.
+    """
+
+    name = "skip_nth"
+
+    def __init__(self, n: int = 2):
+        if n < 2:
+            raise ValueError("n must be at least 2")
+        self.n = n
+        self._count = 0
+
+    def put(self, queue: Queue, frame: Any) -> bool:
+        self._count += 1
+        if self._count % self.n == 0:
+            return False
+        put_latest(queue, frame)
+        return True
+
+
+class AdaptivePolicy(FrameDropPolicy):
+    """Drop frames that would be superseded before the workflow is free.
+
+    Tracks the input frame interval and the inference time as exponential moving
+    averages. While a frame is being processed, an incoming frame is dropped if the
+    remaining inference time exceeds the input interval, since a newer frame will
+    arrive before the workflow can take this one.
+    """
+
+    name = "adaptive"
+
+    def __init__(self, smoothing: float = 0.1):
+        if not 0.0 < smoothing <= 1.0:
+            raise ValueError("smoothing must be in (0, 1]")
+        self.smoothing = smoothing
+        self.input_interval: Optional[float] = None
+        self.inference_time: Optional[float] = None
+        self._last_input_time: Optional[float] = None
+        self._inference_started_at: Optional[float] = None
+
+    def _average(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def put(self, queue: Queue, frame: Any) -> bool:
+        now = time.monotonic()
+        if self._last_input_time is not None:
+            self.input_interval = self._average(self.input_interval, now - self._last_input_time)
+        self._last_input_time = now
+
+        started_at = self._inference_started_at
+        if started_at is not None and self.inference_time is not None and self.input_interval is not None:
+            remaining = started_at + self.inference_time - now
+            if remaining > self.input_interval:
+                return False
+
+        put_latest(queue, frame)
+        return True
+
+    def on_inference_start(self):
+        self._inference_started_at = time.monotonic()
+
+    def on_inference_end(self):
+        started_at = self._inference_started_at
+        if started_at is None:
+            return
+        self.inference_time = self._average(self.inference_time, time.monotonic() - started_at)
+        self._inference_started_at = None
+
+
+FRAME_DROP_POLICIES: Dict[str, Type[FrameDropPolicy]] = {
+    LatestWinsPolicy.name: LatestWinsPolicy,
+    SkipEveryNthPolicy.name: SkipEveryNthPolicy,
+    AdaptivePolicy.name: AdaptivePolicy,
+}
+
+
+def create_frame_drop_policy(policy: Union[str, FrameDropPolicy, None] = None, **kwargs) -> FrameDropPolicy:
+    """Create a frame drop policy.
+
+    Args:
+        policy: A policy instance, the name of a registered policy, or None for latest-wins.
+        **kwargs: Arguments for the policy constructor when given by name.
+    """
+    if isinstance(policy, FrameDropPolicy):
+        return policy
+    if policy is None:
+        policy = LatestWinsPolicy.name
+    if policy not in FRAME_DROP_POLICIES:
+        raise ValueError(
+            f"Unknown frame drop policy '{policy}', expected one of {list(FRAME_DROP_POLICIES)}"
+        )
+    return FRAME_DROP_POLICIES[policy](**kwargs)
@@ -0,0 +1,185 @@
+"""Conversions between the uint8 frames moved through the queues and IMAGE tensors."""
+
+import torch
+import numpy as np
+
+from typing import NamedTuple, Optional, Tuple, Union
+
+from comfystream.buffer_pool import FrameBufferPool
+
+# BT.601 limited range, the default of swscale for yuv420p to rgb24
+_YUV_OFFSETS = (16.0, 128.0, 128.0)
+_YUV_TO_RGB = (
+    (1.164, 0.0, 1.596),
+    (1.164, -0.392, -0.813),
+    (1.164, 2.017, 0.0),
+)
+_RGB_TO_YUV = (
+    (65.481, 128.553, 24.966),
+    (-37.797, -74.203, 112.0),
+    (112.0, -93.786, -18.214),
+)
+
+
+class YUV420Planes(NamedTuple):
+    """Planes of a yuv420p frame as uint8 arrays, chroma at half resolution."""
+
+    y: np.ndarray
+    u: np.ndarray
+    v: np.ndarray
+
+
+def plane_view(plane) -> np.ndarray:
+    """Get a one byte per pixel video plane as a writable uint8 numpy view.
+
+    The view excludes the line padding and keeps the frame memory alive.
+
+    Args:
+        plane: An ``av.VideoPlane``.
+    """
+    return np.frombuffer(plane, dtype=np.uint8).reshape(plane.height, plane.line_size)[:, :plane.width]
+
+
+def yuv420p_planes(frame) -> YUV420Planes:
+    """Get the planes of a yuv420p video frame as numpy views without copying.
+
+    Args:
+        frame: An ``av.VideoFrame`` in yuv420p format.
+    """
+    return YUV420Planes(*(plane_view(plane) for plane in frame.planes))
+
+
+def yuv420_to_float_image(planes: YUV420Planes, device: Optional[Union[str, torch.device]] = None) -> torch.Tensor:
+    """Convert yuv420p planes to a normalized float32 RGB IMAGE tensor.
+
+    Chroma upsampling, color conversion and normalization run as batched torch
+    operations on the target device.
+
+    Args:
+        planes: The uint8 planes of the frame.
+        device: The device to convert on, or None for the CPU.
+    """
+    y, u, v = (torch.from_numpy(plane) for plane in planes)
+    if device is not None:
+        y, u, v = (plane.to(device, non_blocking=True) for plane in (y, u, v))
+    height, width = y.shape
+
+    uv = torch.stack((u, v)).float()
+    uv = uv.repeat_interleave(2, dim=1).repeat_interleave(2, dim=2)[:, :height, :width]
+    yuv = torch.cat((y.float().unsqueeze(0), uv))
+    yuv -= torch.tensor(_YUV_OFFSETS, device=yuv.device).view(3, 1, 1)
+
+    matrix = torch.tensor(_YUV_TO_RGB, device=yuv.device) / 255.0
+    rgb = torch.einsum("ij,jhw->hwi", matrix, yuv)
+    return rgb.clamp_(0.0, 1.0).unsqueeze(0)
+
+
+def _acquire(pool: Optional[FrameBufferPool], shape, dtype: torch.dtype, device) -> torch.Tensor:
+    if pool is None:
+        return torch.empty(shape, dtype=dtype, device=device)
+    return pool.acquire(shape, dtype, device)
+
+
+def rgb_to_yuv420(
+    image: torch.Tensor, pool: Optional[FrameBufferPool] = None
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Convert an RGB image tensor to uint8 yuv420p planes on its current device.
+
+    Uses BT.601 limited range with chroma averaged over 2x2 blocks, matching what the
+    encoder would otherwise do with swscale.
+
+    Args:
+        image: A uint8 or normalized float image in HWC or 1HWC layout.
+        pool: A pool to draw the intermediate and result buffers from. The planes
+            should be released back to the pool once they have been consumed.
+
+    Returns:
+        The y plane at full resolution and the u and v planes at half resolution.
+    """
+    if image.dim() == 4:
+        image = image.squeeze(0)
+    height, width = image.shape[:2]
+    chroma_height, chroma_width = (height + 1) // 2, (width + 1) // 2
+    device = image.device
+
+    matrix = torch.tensor(_RGB_TO_YUV, device=device).t()
+    if image.dtype == torch.uint8:
+        matrix /= 255.0
+    offsets = torch.tensor(_YUV_OFFSETS, device=device)
+
+    rgb = _acquire(pool, (height, width, 3), torch.float32, device)
+    yuv = _acquire(pool, (height, width, 3), torch.float32, device)
+    padded = None
+    uv = _acquire(pool, (chroma_height, chroma_width, 2), torch.float32, device)
+    try:
+        rgb.copy_(image)
+        torch.matmul(rgb.view(-1, 3), matrix, out=yuv.view(-1, 3))
+        yuv += offsets
+
+        chroma = yuv[..., 1:]
+        if height % 2 or width % 2:
+            # Replicate the last row and column so every chroma sample averages a full block
+            padded = _acquire(pool, (2 * chroma_height, 2 * chroma_width, 2), torch.float32, device)
+            padded[:height, :width].copy_(chroma)
+            padded[height:, :width].copy_(chroma[-1:])
+            padded[:, width:].copy_(padded[:, width - 1:width])
+            chroma = padded
+        torch.add(chroma[0::2, 0::2], chroma[1::2, 0::2], out=uv)
+        uv.add_(chroma[0::2, 1::2]).add_(chroma[1::2, 1::2]).mul_(0.25)
+
+        planes = []
+        for source, shape in ((yuv[..., 0], (height, width)), (uv[..., 0], uv.shape[:2]), (uv[..., 1], uv.shape[:2])):
+            plane = _acquire(pool, shape, torch.uint8, device)
+            plane.copy_(source.add_(0.5).clamp_(0, 255))
+            planes.append(plane)
+    finally:
+        for buffer in (rgb, yuv, padded, uv):
+            if pool is not None and buffer is not None:
+                pool.release(buffer)
+
+    y, u, v = planes
+    return y, u, v
+
+
+def to_float_image(
+    image: Union[torch.Tensor, YUV420Planes], device: Optional[Union[str, torch.device]] = None
+) -> torch.Tensor:
+    """Convert a uint8 image tensor or yuv420p planes to a normalized float32 IMAGE tensor.
+
+    Moving to the device happens before the conversion so only the uint8 bytes are
+    copied. Float tensors are returned unchanged apart from the device move.
+
+    Args:
+        image: The image tensor in BHWC layout or the planes of a yuv420p frame.
+        device: The device to move the tensor to, or None to keep it in place.
+    """
+    if isinstance(image, YUV420Planes):
+        return yuv420_to_float_image(image, device)
+    if device is not None:
+        image = image.to(device, non_blocking=True)
+    if image.dtype == torch.uint8:
+        return image.float().div_(255.0)
+    return image
+
+
+def to_uint8_image(image: torch.Tensor, pool: Optional[FrameBufferPool] = None) -> torch.Tensor:
+    """Quantize a normalized float IMAGE tensor to uint8 on its current device.
+
+    Args:
+        image: The image tensor to quantize.
+        pool: A pool to draw the scratch and result buffers from. The result should be
+            released back to the pool once it has been consumed.
+    """
+    if image.dtype == torch.uint8:
+        return image
+    if pool is None:
+        return image.mul(255.0).clamp_(0, 255).to(dtype=torch.uint8)
+
+    scratch = pool.acquire(image.shape, image.dtype, image.device)
+    try:
+        torch.mul(image, 255.0, out=scratch).clamp_(0, 255)
+        result = pool.acquire(image.shape, torch.uint8, image.device)
+        result.copy_(scratch)
+    finally:
+        pool.release(scratch)
+    return result
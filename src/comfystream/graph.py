@@ -0,0 +1,167 @@
+"""Graph analysis of prompts in API format."""
+
+from collections import deque
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping, Set
+
+# Nodes that read a new stream input on every execution
+STREAM_INPUT_CLASS_TYPES = ["LoadTensor", "LoadAudioTensor"]
+
+
+def to_builtin(value: Any) -> Any:
+    """Convert validated prompt values to plain python types."""
+    if isinstance(value, Mapping):
+        return {str(k): to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(v) for v in value]
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, str):
+        return str(value)
+    return value
+
+
+def is_link(value: Any) -> bool:
+    """Whether an input value is a link ``[node_id, output_index]`` to another node."""
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and isinstance(value[1], int)
+    )
+
+
+def topological_order(prompt: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Order node ids so every node comes after the nodes it takes inputs from.
+
+    Raises:
+        ValueError: If a link points to a missing node or the graph has a cycle.
+    """
+    dependencies: Dict[str, Set[str]] = {}
+    dependents: Dict[str, List[str]] = {node_id: [] for node_id in prompt}
+    for node_id, node in prompt.items():
+        dependencies[node_id] = set()
+        for value in node.get("inputs", {}).values():
+            if is_link(value):
+                if value[0] not in prompt:
+                    raise ValueError(f"Node {node_id} links to missing node {value[0]}")
+                dependencies[node_id].add(value[0])
+                dependents[value[0]].append(node_id)
+
+    ready = deque(node_id for node_id, deps in dependencies.items() if not deps)
+    order = []
+    while ready:
+        node_id = ready.popleft()
+        order.append(node_id)
+        for dependent in dependents[node_id]:
+            dependencies[dependent].discard(node_id)
+            if not dependencies[dependent]:
+                ready.append(dependent)
+
+    if len(order) != len(prompt):
+        raise ValueError("Prompt graph contains a cycle")
+    return order
+
+
+def downstream_nodes(prompt: Dict[str, Dict[str, Any]], roots: Set[str]) -> Set[str]:
+    """Get the given nodes and every node that depends on them directly or indirectly."""
+    dependents: Dict[str, List[str]] = {node_id: [] for node_id in prompt}
+    for node_id, node in prompt.items():
+        for value in node.get("inputs", {}).values():
+            if is_link(value) and value[0] in dependents:
+                dependents[value[0]].append(node_id)
+
+    reached = set(roots)
+    pending = list(roots)
+    while pending:
+        for dependent in dependents[pending.pop()]:
+            if dependent not in reached:
+                reached.add(dependent)
+                pending.append(dependent)
+    return reached
+
+
+def upstream_nodes(prompt: Dict[str, Dict[str, Any]], roots: Set[str]) -> Set[str]:
+    """Get the given nodes and every node they depend on directly or indirectly."""
+    reached = set(roots)
+    pending = list(roots)
+    while pending:
+        for value in prompt[pending.pop()].get("inputs", {}).values():
+            if is_link(value) and value[0] in prompt and value[0] not in reached:
+                reached.add(value[0])
+                pending.append(value[0])
+    return reached
+
+
+def prune_unreachable_nodes(prompt: Dict[str, Dict[str, Any]], outputs: Set[str]) -> Set[str]:
+    """Remove the nodes that none of the given output nodes depend on, in place.
+
+    Returns:
+        The ids of the removed nodes.
+    """
+    unreachable = set(prompt) - upstream_nodes(prompt, outputs)
+    for node_id in unreachable:
+        del prompt[node_id]
+    return unreachable
+
+
+def find_constant_nodes(prompt: Dict[str, Dict[str, Any]]) -> Set[str]:
+    """Find the nodes whose outputs do not depend on the stream inputs.
+
+    Every node that is not downstream of a ``LoadTensor`` or ``LoadAudioTensor`` node,
+    such as model loaders and text encoders, produces the same outputs for every frame.
+    """
+    stream_inputs = {
+        node_id for node_id, node in prompt.items() if node.get("class_type") in STREAM_INPUT_CLASS_TYPES
+    }
+    return set(prompt) - downstream_nodes(prompt, stream_inputs)
+
+
+class PromptDiff:
+    """Node level differences between two prompts."""
+
+    def __init__(self, added: Set[str], removed: Set[str], changed: Set[str], invalidated: Set[str]):
+        """Initializes the PromptDiff class.
+
+        Args:
+            added: Nodes only in the new prompt.
+            removed: Nodes only in the old prompt.
+            changed: Nodes in both prompts whose class type or inputs, including links, differ.
+            invalidated: Nodes of the new prompt whose outputs may differ, i.e. the added
+                and changed nodes and everything downstream of them.
+        """
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.invalidated = invalidated
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self) -> str:
+        return (
+            f"PromptDiff(added={sorted(self.added)}, removed={sorted(self.removed)}, "
+            f"changed={sorted(self.changed)}, invalidated={sorted(self.invalidated)})"
+        )
+
+
+def diff_prompts(old_prompt: Mapping[str, Any], new_prompt: Mapping[str, Any]) -> PromptDiff:
+    """Compute which nodes an update to a prompt affects.
+
+    Args:
+        old_prompt: The current prompt.
+        new_prompt: The updated prompt.
+    """
+    old_prompt = to_builtin(old_prompt)
+    new_prompt = to_builtin(new_prompt)
+
+    added = set(new_prompt) - set(old_prompt)
+    removed = set(old_prompt) - set(new_prompt)
+    changed = {
+        node_id
+        for node_id in set(new_prompt) & set(old_prompt)
+        if new_prompt[node_id].get("class_type") != old_prompt[node_id].get("class_type")
+        or new_prompt[node_id].get("inputs", {}) != old_prompt[node_id].get("inputs", {})
+    }
+    invalidated = downstream_nodes(new_prompt, added | changed)
+    return PromptDiff(added, removed, changed, invalidated)
@@ -0,0 +1,56 @@
+import os
+import asyncio
+import logging
+
+from comfystream.node_metadata import node_metadata_index
+from comfystream.timing import NodeProgressTimer
+
+from comfy.cli_args_types import Configuration
+from comfy.client.embedded_comfy_client import EmbeddedComfyClient
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHost:
+    """An embedded ComfyUI client shared by the stream clients of a process.
+
+    Models are loaded into the embedded client, so streams sharing a host load their
+    weights once, and the weights stay loaded between connections.
+    """
+
+    def __init__(self, max_workers: int = 1, **kwargs):
+        """Initializes the ModelHost class.
+
+        Args:
+            max_workers: The number of prompts the embedded client executes concurrently.
+            **kwargs: The ComfyUI configuration.
+        """
+        self.config = Configuration(**kwargs)
+        # Times the nodes of queued prompts, the executor reports every node it starts
+        self.node_timer = NodeProgressTimer()
+        self.comfy_client = EmbeddedComfyClient(
+            self.config, progress_handler=self.node_timer, max_workers=max_workers
+        )
+        self._lock = asyncio.Lock()
+
+        # Rebuild the node metadata when custom node packages are added or removed
+        node_metadata_index.add_watch_path(os.path.join(kwargs.get("cwd") or os.getcwd(), "custom_nodes"))
+
+    @property
+    def is_running(self) -> bool:
+        return self.comfy_client.is_running
+
+    async def start(self):
+        """Start the embedded client if it is not running yet."""
+        async with self._lock:
+            if not self.comfy_client.is_running:
+                await self.comfy_client.__aenter__()
+
+    async def stop(self):
+        """Stop the embedded client, unloading its models."""
+        async with self._lock:
+            if self.comfy_client.is_running:
+                try:
+                    await self.comfy_client.__aexit__()
+                except Exception as e:
+                    logger.error(f"Error during ComfyClient cleanup: {e}")
@@ -0,0 +1,121 @@
+"""Process wide index of node input metadata for the UI control panel."""
+
+import os
+import logging
+
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_input_spec(input_types: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Parse the ``INPUT_TYPES`` of a node class into per input metadata.
+
+    Args:
+        input_types: The result of ``INPUT_TYPES()``.
+
+    Returns:
+        The type, bounds and widget of each required and optional input keyed by name.
+        Combo inputs have the type ``combo`` and their options as value.
+    """
+    input_info = {}
+    for section, required in (("required", True), ("optional", False)):
+        for name, value in input_types.get(section, {}).items():
+            if not isinstance(value, tuple):
+                logger.error(f"Unexpected structure for {section} input {name}: {value}")
+                continue
+
+            if len(value) == 1 and isinstance(value[0], list):
+                # Handle combo box case where value is ([option1, option2, ...],)
+                input_info[name] = {
+                    "type": "combo",
+                    "value": value[0],  # The list of options becomes the value
+                }
+            elif len(value) == 2:
+                input_type, config = value
+                input_info[name] = {
+                    "type": input_type,
+                    "required": required,
+                    "min": config.get("min", None),
+                    "max": config.get("max", None),
+                    "widget": config.get("widget", None),
+                }
+            elif len(value) == 1:
+                # Handle simple type case like ('IMAGE',)
+                input_info[name] = {"type": value[0]}
+    return input_info
+
+
+class NodeMetadataIndex:
+    """Input metadata of node classes keyed by class type.
+
+    Node classes are loaded once and the input spec of a class is parsed the first time
+    it is looked up. The index is rebuilt when one of the watched node package
+    directories changes, i.e. a package is added or removed, or on ``invalidate``.
+    """
+
+    def __init__(self, load_node_classes: Callable[[], Mapping[str, type]], watch_paths: Iterable[str] = ()):
+        """Initializes the NodeMetadataIndex class.
+
+        Args:
+            load_node_classes: Loads the node classes keyed by class type.
+            watch_paths: Directories whose modification invalidates the index.
+        """
+        self._load_node_classes = load_node_classes
+        self._watch_paths = set(watch_paths)
+        self._signature: Optional[Tuple[Tuple[str, Optional[int]], ...]] = None
+        self._node_classes: Optional[Mapping[str, type]] = None
+        self._input_info: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def add_watch_path(self, path: str):
+        """Watch another node package directory for changes."""
+        if path not in self._watch_paths:
+            self._watch_paths.add(path)
+            self._signature = None
+
+    def invalidate(self):
+        """Drop the index so it is rebuilt on the next lookup."""
+        self._node_classes = None
+        self._input_info.clear()
+
+    def _current_signature(self) -> Tuple[Tuple[str, Optional[int]], ...]:
+        signature = []
+        for path in sorted(self._watch_paths):
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                signature.append((path, None))
+        return tuple(signature)
+
+    @property
+    def node_classes(self) -> Mapping[str, type]:
+        """The node classes keyed by class type, reloaded if node packages changed."""
+        signature = self._current_signature()
+        if self._node_classes is None or signature != self._signature:
+            self.invalidate()
+            self._node_classes = self._load_node_classes()
+            self._signature = signature
+        return self._node_classes
+
+    def get(self, class_type: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Get the input metadata of a class type, or None if no such node class is loaded."""
+        node_classes = self.node_classes
+        input_info = self._input_info.get(class_type)
+        if input_info is None:
+            node_class = node_classes.get(class_type)
+            if node_class is None:
+                return None
+            input_types = node_class.INPUT_TYPES() if hasattr(node_class, "INPUT_TYPES") else {}
+            input_info = parse_input_spec(input_types)
+            self._input_info[class_type] = input_info
+        return input_info
+
+
+def _load_workspace_node_classes() -> Mapping[str, type]:
+    from comfy.nodes.package import import_all_nodes_in_workspace
+
+    return import_all_nodes_in_workspace().NODE_CLASS_MAPPINGS
+
+
+# Shared by all clients of the process since they load the same node packages
+node_metadata_index = NodeMetadataIndex(_load_workspace_node_classes)
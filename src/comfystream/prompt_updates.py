@@ -0,0 +1,56 @@
+"""Coalescing of prompt updates sent while a stream is running."""
+
+import asyncio
+
+from typing import Any, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class PromptUpdateCoalescer(Generic[T]):
+    """Holds the latest pending prompt update of a stream until it is applied.
+
+    Updates are submitted on the event loop as fast as the UI sends them and taken at
+    frame boundaries by the prompt runners. Only the newest pending update is kept, an
+    update replaced before it was taken is acknowledged as superseded.
+    """
+
+    def __init__(self):
+        self._pending: Optional[Tuple[T, asyncio.Future]] = None
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def submit(self, update: T) -> asyncio.Future:
+        """Make an update the pending one, superseding any update still pending.
+
+        Returns:
+            A future resolving to True once the update is applied, or to False if it
+            was superseded or discarded before being applied.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.discard()
+        self._pending = (update, future)
+        return future
+
+    def take(self) -> Optional[Tuple[T, asyncio.Future]]:
+        """Take the pending update and the future to resolve when it is applied, if any."""
+        pending, self._pending = self._pending, None
+        return pending
+
+    def discard(self):
+        """Drop the pending update, acknowledging it as not applied."""
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            resolve(pending[1], False)
+
+
+def resolve(future: asyncio.Future, result: Any = None, exception: Optional[BaseException] = None):
+    """Resolve an update future unless its waiter already gave up on it."""
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
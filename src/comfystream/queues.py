@@ -0,0 +1,125 @@
+"""Queues bridging the ComfyUI worker threads and the asyncio event loop."""
+
+import asyncio
+import threading
+import numpy as np
+
+from collections import deque
+from typing import Callable, Deque, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Called with the queued items when a put would exceed the bound. It must remove
+# items to make room and return how many units (frames, samples, ...) were dropped.
+OverflowStrategy = Callable[[Deque], int]
+
+
+def drop_oldest(items: Deque) -> int:
+    """Drop the oldest queued item."""
+    items.popleft()
+    return 1
+
+
+def compact_audio(items: Deque) -> int:
+    """Drop the oldest audio chunk and merge the rest into a single chunk.
+
+    The consumer can then catch up on the backlog in one read instead of one per chunk.
+
+    Returns:
+        The number of dropped samples.
+    """
+    dropped = len(items.popleft())
+    if len(items) > 1:
+        merged = np.concatenate(list(items))
+        items.clear()
+        items.append(merged)
+    return dropped
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class LoopBoundQueue(Generic[T]):
+    """Queue that can be fed from any thread and awaited from an event loop.
+
+    ``asyncio.Queue`` is not thread-safe, so putting to it from the ComfyUI executor
+    thread can lose wakeups of a pending ``get``. Here items are appended under a lock
+    and waiting consumers are woken on their own loop with ``call_soon_threadsafe``.
+
+    When bounded, a put never blocks the producer. The overflow strategy makes room
+    instead and the number of dropped units is accumulated in ``dropped``.
+    """
+
+    def __init__(self, maxsize: int = 0, overflow: Optional[OverflowStrategy] = None):
+        """Initializes the LoopBoundQueue class.
+
+        Args:
+            maxsize: The maximum number of queued items, 0 for unbounded.
+            overflow: How to make room when full. Defaults to dropping the oldest item.
+        """
+        self.maxsize = maxsize
+        self.overflow = overflow or drop_oldest
+        self.dropped = 0
+        self._items: Deque[T] = deque()
+        self._waiters: List[asyncio.Future] = []
+        self._lock = threading.Lock()
+
+    def qsize(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not self._items
+
+    def put_nowait(self, item: T):
+        """Put an item without blocking. Safe to call from any thread."""
+        with self._lock:
+            self._items.append(item)
+            while self.maxsize > 0 and len(self._items) > self.maxsize:
+                self.dropped += self.overflow(self._items)
+            waiters, self._waiters = self._waiters, []
+        self._wake_waiters(waiters)
+
+    async def put(self, item: T):
+        self.put_nowait(item)
+
+    def get_nowait(self) -> T:
+        with self._lock:
+            if not self._items:
+                raise asyncio.QueueEmpty
+            return self._items.popleft()
+
+    async def get(self) -> T:
+        """Remove and return an item, waiting until one is available."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+                waiter = loop.create_future()
+                self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                raise
+
+    def _wake_waiters(self, waiters: List[asyncio.Future]):
+        # Every waiter is woken and re-checks the items, so a waiter cancelled after
+        # being woken can never swallow the wakeup meant for another one.
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        for waiter in waiters:
+            loop = waiter.get_loop()
+            if loop is running_loop:
+                _wake(waiter)
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
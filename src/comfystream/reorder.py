@@ -0,0 +1,110 @@
+"""Tracking and reordering of video frames processed by several workers at once."""
+
+import time
+import heapq
+import itertools
+import threading
+
+from typing import Any, List, Optional, Set, Tuple
+
+
+class InFlightFrames:
+    """Sequence numbers of the frames taken by workflow workers that have no output yet.
+
+    Each worker thread processes one frame at a time from LoadTensor to SaveTensor, so
+    the frame a worker is on is tracked per thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seqs: Set[int] = set()
+        self._local = threading.local()
+
+    def start(self, seq: Optional[int]):
+        """Record that the calling worker took the frame with the given sequence number.
+
+        A frame the worker did not finish, because its execution failed, is forgotten.
+        """
+        previous = self.current()
+        self._local.seq = seq
+        self._local.started_at = time.perf_counter()
+        with self._lock:
+            if previous is not None:
+                self._seqs.discard(previous)
+            if seq is not None:
+                self._seqs.add(seq)
+
+    def current(self) -> Optional[int]:
+        """Get the sequence number of the frame the calling worker is processing."""
+        return getattr(self._local, "seq", None)
+
+    def finish(self) -> Optional[float]:
+        """Record that the calling worker produced the output of its frame.
+
+        Returns:
+            The seconds since the worker took the frame, or None if it took none.
+        """
+        seq = self.current()
+        started_at = getattr(self._local, "started_at", None)
+        self._local.seq = None
+        self._local.started_at = None
+        if seq is not None:
+            with self._lock:
+                self._seqs.discard(seq)
+        return time.perf_counter() - started_at if started_at is not None else None
+
+    def oldest(self) -> Optional[int]:
+        """Get the lowest sequence number still being processed, or None if there is none."""
+        with self._lock:
+            return min(self._seqs, default=None)
+
+    def clear(self):
+        with self._lock:
+            self._seqs.clear()
+
+
+class ReorderBuffer:
+    """Holds outputs that finished ahead of older frames still in flight.
+
+    An output is released once no older frame is being processed. Outputs without a
+    sequence number, such as those of warmup frames, are released right away. To bound
+    the added latency, and to not wait forever on a frame whose execution failed, the
+    oldest output is also released once more than ``max_pending`` outputs are held.
+    """
+
+    def __init__(self, in_flight: InFlightFrames, max_pending: int = 8):
+        self.in_flight = in_flight
+        self.max_pending = max_pending
+        self._heap: List[Tuple[int, int, Optional[int], Any]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, seq: Optional[int], output: Any):
+        key = -1 if seq is None else seq
+        heapq.heappush(self._heap, (key, next(self._counter), seq, output))
+
+    def pop(self) -> Optional[Tuple[Optional[int], Any]]:
+        """Release the oldest buffered output if no older frame is in flight, else None."""
+        if not self._heap:
+            return None
+
+        _, _, seq, output = self._heap[0]
+        if seq is not None and len(self._heap) <= self.max_pending:
+            oldest = self.in_flight.oldest()
+            if oldest is not None and oldest < seq:
+                return None
+
+        heapq.heappop(self._heap)
+        return seq, output
+
+    def clear(self) -> List[Any]:
+        """Drop all buffered outputs.
+
+        Returns:
+            The dropped outputs, so their buffers can be released.
+        """
+        outputs = [output for _, _, _, output in self._heap]
+        self._heap.clear()
+        return outputs
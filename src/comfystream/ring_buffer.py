@@ -0,0 +1,97 @@
+"""Ring buffer for accumulating audio samples without per-frame reallocation."""
+
+import numpy as np
+
+from typing import Optional
+
+
+class AudioRingBuffer:
+    """Circular buffer of audio samples with read, write and peek.
+
+    Reads and writes copy into the preallocated storage, so steady state streaming does
+    not allocate. If a write exceeds the free space the storage grows to fit it.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype = np.int16):
+        """Initializes the AudioRingBuffer class.
+
+        Args:
+            capacity: The initial number of samples the buffer can hold.
+            dtype: The sample type.
+        """
+        self._buffer = np.zeros(max(int(capacity), 1), dtype=dtype)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._buffer.dtype
+
+    def write(self, samples: np.ndarray):
+        """Append samples to the end of the buffer."""
+        samples = np.asarray(samples).ravel()
+        n = len(samples)
+        if n == 0:
+            return
+        if self._size + n > self.capacity:
+            self._grow(self._size + n)
+
+        capacity = self.capacity
+        end = (self._start + self._size) % capacity
+        first = min(n, capacity - end)
+        self._buffer[end:end + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
+        self._size += n
+
+    def peek(self, n: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Copy the oldest samples without consuming them.
+
+        Args:
+            n: The number of samples to copy.
+            out: An array of at least ``n`` samples to copy into. A new array is
+                allocated if None.
+
+        Returns:
+            The first ``n`` entries of ``out`` holding the samples.
+        """
+        if n > self._size:
+            raise ValueError(f"Cannot read {n} samples, only {self._size} buffered")
+        if out is None:
+            out = np.empty(n, dtype=self.dtype)
+        out = out[:n]
+
+        first = min(n, self.capacity - self._start)
+        out[:first] = self._buffer[self._start:self._start + first]
+        out[first:] = self._buffer[:n - first]
+        return out
+
+    def read(self, n: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Copy and consume the oldest samples. See ``peek`` for the arguments."""
+        out = self.peek(n, out)
+        self.skip(n)
+        return out
+
+    def skip(self, n: int):
+        """Consume the oldest samples without copying them."""
+        n = min(n, self._size)
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        if self._size == 0:
+            self._start = 0
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def _grow(self, min_capacity: int):
+        buffer = np.zeros(max(min_capacity, 2 * self.capacity), dtype=self.dtype)
+        self.peek(self._size, out=buffer)
+        self._buffer = buffer
+        self._start = 0
@@ -1,14 +1,128 @@
+import threading
 import torch
 import numpy as np
 
-from queue import Queue
-from asyncio import Queue as AsyncQueue
+from queue import Empty, Queue
 
-from typing import Union
+from typing import Dict, Optional, Tuple, Union
 
-# TODO: improve eviction policy fifo might not be the best, skip alternate frames instead
-image_inputs: Queue[Union[torch.Tensor, np.ndarray]] = Queue(maxsize=1)
-image_outputs: AsyncQueue[Union[torch.Tensor, np.ndarray]] = AsyncQueue()
+from comfystream.buffer_pool import FrameBufferPool
+from comfystream.frame_drop import FrameDropPolicy, LatestWinsPolicy, put_latest
+from comfystream.queues import LoopBoundQueue, compact_audio, drop_oldest
+from comfystream.reorder import InFlightFrames
+from comfystream.timing import LatencyWindow
 
-audio_inputs: Queue[Union[torch.Tensor, np.ndarray]] = Queue()
-audio_outputs: AsyncQueue[Union[torch.Tensor, np.ndarray]] = AsyncQueue()
+DEFAULT_SESSION_ID = "default"
+
+# Bounds of the output queues when the consumer falls behind, 0 for unbounded
+DEFAULT_MAX_VIDEO_OUTPUTS = 4
+DEFAULT_MAX_AUDIO_OUTPUTS = 8
+
+
+# Put in the input queues of a closed session to wake the nodes waiting on them
+SESSION_CLOSED = object()
+
+
+class SessionClosed(Exception):
+    """Raised by a stream node waiting for input of a session that was closed."""
+
+
+class SessionChannels:
+    """Input and output queues for a single stream session.
+
+    Inputs are put on the event loop and taken by the ComfyUI worker threads, outputs
+    flow the other way through loop-bound queues that are safe to feed from any thread.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+
+        self.image_inputs: Queue[Union[torch.Tensor, np.ndarray]] = Queue(maxsize=1)
+        self.frame_drop_policy: FrameDropPolicy = LatestWinsPolicy()
+        # Outputs are paired with the sequence number of the input frame they came from
+        self.image_outputs: LoopBoundQueue[Tuple[Optional[int], Union[torch.Tensor, np.ndarray]]] = LoopBoundQueue(
+            maxsize=DEFAULT_MAX_VIDEO_OUTPUTS, overflow=drop_oldest
+        )
+        # Sequence numbers of frames taken by LoadTensor that have not reached SaveTensor yet
+        self.in_flight = InFlightFrames()
+        # Time from LoadTensor taking a frame to SaveTensor producing its output
+        self.inference_latency = LatencyWindow()
+        # Reusable buffers for outputs, released by the consumer once a frame is sent
+        self.buffer_pool = FrameBufferPool()
+
+        self.audio_inputs: Queue[Union[torch.Tensor, np.ndarray]] = Queue()
+        self.audio_outputs: LoopBoundQueue[Union[torch.Tensor, np.ndarray]] = LoopBoundQueue(
+            maxsize=DEFAULT_MAX_AUDIO_OUTPUTS, overflow=compact_audio
+        )
+
+        self.closed = False
+
+    def get_input(self, queue: Queue):
+        """Block until the next input of one of the input queues is available.
+
+        Raises:
+            SessionClosed: If the session is closed before or while waiting.
+        """
+        if self.closed:
+            raise SessionClosed(self.session_id)
+        item = queue.get(block=True)
+        if item is SESSION_CLOSED:
+            # Pass the wakeup on to the next node waiting on the queue
+            put_latest(queue, SESSION_CLOSED)
+            raise SessionClosed(self.session_id)
+        return item
+
+    def clear_inputs(self):
+        """Drop the queued inputs, keeping the wakeup of a closed session."""
+        for queue in (self.image_inputs, self.audio_inputs):
+            while True:
+                try:
+                    queue.get_nowait()
+                except Empty:
+                    break
+            if self.closed:
+                put_latest(queue, SESSION_CLOSED)
+
+    def close(self):
+        """Close the session, waking the nodes waiting for its input so their workers return."""
+        self.closed = True
+        for queue in (self.image_inputs, self.audio_inputs):
+            put_latest(queue, SESSION_CLOSED)
+
+
+_channels: Dict[str, SessionChannels] = {}
+_channels_lock = threading.Lock()
+
+
+def get_channels(session_id: str = DEFAULT_SESSION_ID) -> SessionChannels:
+    """Get the channels for a session, creating them on first use.
+
+    Args:
+        session_id: The id of the stream session. Empty ids map to the default session.
+    """
+    session_id = session_id or DEFAULT_SESSION_ID
+    with _channels_lock:
+        channels = _channels.get(session_id)
+        if channels is None:
+            channels = SessionChannels(session_id)
+            _channels[session_id] = channels
+        return channels
+
+
+def remove_channels(session_id: str):
+    """Drop the channels for a session from the registry.
+
+    The default session is kept since the module level queues alias it.
+    """
+    if not session_id or session_id == DEFAULT_SESSION_ID:
+        return
+    with _channels_lock:
+        _channels.pop(session_id, None)
+
+
+# Queues of the default session, used by nodes running without a session id
+_default_channels = get_channels(DEFAULT_SESSION_ID)
+image_inputs = _default_channels.image_inputs
+image_outputs = _default_channels.image_outputs
+audio_inputs = _default_channels.audio_inputs
+audio_outputs = _default_channels.audio_outputs
@@ -0,0 +1,151 @@
+"""Rolling latency statistics of workflow executions."""
+
+import time
+import bisect
+import threading
+
+from collections import deque
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+
+# Upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+# Number of most recent samples the statistics are computed over
+DEFAULT_WINDOW = 300
+
+
+class LatencyWindow:
+    """The most recent latency samples of one execution step.
+
+    Recording only appends to a bounded deque so it is cheap enough to run for every
+    node of every frame, the statistics are computed when a snapshot is taken.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def mean(self) -> Optional[float]:
+        """Get the mean of the current window in seconds, or None if there are no samples."""
+        samples = list(self.samples)
+        return sum(samples) / len(samples) if samples else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the statistics of the current window.
+
+        Returns:
+            The total number of samples, the mean, percentiles and maximum of the window
+            in milliseconds and the window's histogram over ``LATENCY_BUCKETS_MS``.
+        """
+        samples = sorted(sample * 1000 for sample in list(self.samples))
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for sample in samples:
+            buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, sample)] += 1
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": self.count,
+            "mean_ms": sum(samples) / len(samples) if samples else None,
+            "p50_ms": percentile(0.5),
+            "p90_ms": percentile(0.9),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] if samples else None,
+            "buckets_ms": LATENCY_BUCKETS_MS,
+            "histogram": buckets,
+        }
+
+
+class PromptTimings:
+    """Latency of whole frames and of each node of a prompt."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.frame = LatencyWindow(window)
+        self.nodes: Dict[str, LatencyWindow] = {}
+        self.class_types: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record_node(self, node_id: str, class_type: str, seconds: float):
+        latency = self.nodes.get(node_id)
+        if latency is None:
+            with self._lock:
+                latency = self.nodes.setdefault(node_id, LatencyWindow(self.window))
+                self.class_types[node_id] = class_type
+        latency.record(seconds)
+
+    def record_frame(self, seconds: float):
+        self.frame.record(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = dict(self.nodes)
+        return {
+            "frame": self.frame.snapshot(),
+            "nodes": {
+                node_id: {"class_type": self.class_types[node_id], **latency.snapshot()}
+                for node_id, latency in nodes.items()
+            },
+        }
+
+
+class NodeProgressTimer:
+    """Times the nodes of prompts queued to the ComfyUI executor from its progress events.
+
+    The executor sends an ``executing`` event before every node it runs and one without
+    a node once the prompt is done, so the time between two events of a prompt is spent
+    in the node of the first. Implements the progress handler interface of the embedded
+    client, events of prompts that are not watched are ignored.
+    """
+
+    def __init__(self):
+        self.client_id = None
+        self.last_node_id = None
+        self.last_prompt_id = None
+        self.receive_all_progress_notifications = True
+        self._watched: Dict[str, Tuple[Mapping[str, Any], PromptTimings]] = {}
+        self._running: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, prompt_id: str, prompt: Mapping[str, Any], timings: PromptTimings):
+        """Record the nodes of a prompt into ``timings`` while it is executed."""
+        with self._lock:
+            self._watched[prompt_id] = (prompt, timings)
+
+    def unwatch(self, prompt_id: str):
+        with self._lock:
+            self._watched.pop(prompt_id, None)
+            self._running.pop(prompt_id, None)
+
+    def send_sync(self, event: str, data: Any, sid: Optional[str] = None):
+        if event != "executing" or not isinstance(data, Mapping):
+            return
+
+        now = time.perf_counter()
+        prompt_id = data.get("prompt_id")
+        node_id = data.get("node")
+        with self._lock:
+            watched = self._watched.get(prompt_id)
+            if watched is None:
+                return
+            previous = self._running.pop(prompt_id, None)
+            if node_id is not None:
+                self._running[prompt_id] = (str(node_id), now)
+
+        if previous is not None:
+            prompt, timings = watched
+            previous_id, started_at = previous
+            node = prompt.get(previous_id) or {}
+            timings.record_node(previous_id, str(node.get("class_type", "")), now - started_at)
+
+    async def send(self, event: str, data: Any, sid: Optional[str] = None):
+        self.send_sync(event, data, sid)
+
+    def queue_updated(self, *args, **kwargs):
+        pass
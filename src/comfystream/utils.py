@@ -1,7 +1,15 @@
 import copy
+import json
+import hashlib
+import logging
+import threading
 
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set, Tuple
 from comfy.api.components.schema.prompt import Prompt, PromptDictInput
+from comfystream.graph import downstream_nodes, prune_unreachable_nodes, to_builtin
+
+logger = logging.getLogger(__name__)
 
 
 def create_load_tensor_node():
@@ -20,12 +28,127 @@ def create_save_tensor_node(inputs: Dict[Any, Any]):
     }
 
 
-def convert_prompt(prompt: PromptDictInput) -> Prompt:
+SESSION_NODE_CLASS_TYPES = ["LoadTensor", "SaveTensor", "LoadAudioTensor", "SaveAudioTensor"]
+OUTPUT_NODE_CLASS_TYPES = ["SaveTensor", "SaveAudioTensor"]
+# Input and output nodes of prompts before conversion
+PROMPT_INPUT_CLASS_TYPES = ["PrimaryInputLoadImage", "LoadImage", "LoadTensor", "LoadAudioTensor"]
+PROMPT_OUTPUT_CLASS_TYPES = ["PreviewImage", "SaveImage"] + OUTPUT_NODE_CLASS_TYPES
+
+# Number of converted prompts kept by convert_prompt
+CONVERT_PROMPT_CACHE_SIZE = 32
+
+# Session independent conversions keyed by prompt content hash, and their bindings to
+# sessions keyed by content hash and session id until the session is released
+_converted_prompts: "OrderedDict[str, Prompt]" = OrderedDict()
+_bound_prompts: "OrderedDict[Tuple[str, str], Prompt]" = OrderedDict()
+_converted_prompts_lock = threading.Lock()
+
+
+def prompt_hash(prompt: PromptDictInput) -> Optional[str]:
+    """Hash the content of a prompt independently of its key order.
+
+    Returns:
+        The hex digest, or None if the prompt cannot be serialized.
+    """
+    try:
+        canonical = json.dumps(prompt, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def clear_convert_prompt_cache():
+    with _converted_prompts_lock:
+        _converted_prompts.clear()
+        _bound_prompts.clear()
+
+
+def release_session_prompts(session_id: str):
+    """Drop the cached prompts bound to a session that was closed."""
+    with _converted_prompts_lock:
+        for key in [key for key in _bound_prompts if key[1] == session_id]:
+            del _bound_prompts[key]
+
+
+def _cache_get(cache: OrderedDict, key: Any) -> Optional[Prompt]:
+    with _converted_prompts_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache: OrderedDict, key: Any, value: Prompt):
+    with _converted_prompts_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CONVERT_PROMPT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def convert_prompt(prompt: PromptDictInput, session_id: Optional[str] = None) -> Prompt:
+    """Convert a prompt into one that runs on stream tensors.
+
+    Converted prompts are validated and immutable, so the most recently used ones are
+    kept. The session independent conversion is kept by prompt content and shared by all
+    sessions, e.g. a reconnecting client, and its binding to a session is kept until
+    the session is released with ``release_session_prompts``.
+
+    Args:
+        prompt: The prompt in API format.
+        session_id: The stream session to bind the tensor nodes to. If None, the nodes
+            use the default session.
+    """
+    digest = prompt_hash(prompt)
+    if digest is None:
+        return bind_session(_convert_prompt(prompt), session_id)
+
+    if session_id is not None:
+        bound = _cache_get(_bound_prompts, (digest, session_id))
+        if bound is not None:
+            return bound
+
+    converted = _cache_get(_converted_prompts, digest)
+    if converted is None:
+        converted = _convert_prompt(prompt)
+        _cache_put(_converted_prompts, digest, converted)
+    if session_id is None:
+        return converted
+
+    bound = bind_session(converted, session_id)
+    _cache_put(_bound_prompts, (digest, session_id), bound)
+    return bound
+
+
+def bind_session(prompt: Prompt, session_id: Optional[str]) -> Prompt:
+    """Bind the tensor nodes of a converted prompt to a stream session.
+
+    Args:
+        prompt: The converted prompt, it is not modified.
+        session_id: The stream session, None keeps the nodes on the default session.
+    """
+    if session_id is None:
+        return prompt
+
+    prompt = to_builtin(prompt)
+    for node in prompt.values():
+        if node.get("class_type") in SESSION_NODE_CLASS_TYPES:
+            node["inputs"]["session_id"] = session_id
+    return Prompt.validate(prompt)
+
+
+def _convert_prompt(prompt: PromptDictInput) -> Prompt:
     # Validate the schema
     Prompt.validate(prompt)
 
     prompt = copy.deepcopy(prompt)
 
+    # Drop nodes the output does not depend on before counting, so stray inputs and
+    # outputs do not fail the conversion and their models are never loaded
+    removed = _prune_stray_nodes(prompt)
+    if removed:
+        logger.info(f"Removed nodes not reachable from the output: {sorted(removed)}")
+
     num_primary_inputs = 0
     num_inputs = 0
     num_outputs = 0
@@ -85,3 +208,24 @@ def convert_prompt(prompt: PromptDictInput) -> Prompt:
     prompt = Prompt.validate(prompt)
 
     return prompt
+
+
+def _prune_stray_nodes(prompt: PromptDictInput) -> Set[str]:
+    """Remove the nodes no stream output depends on, in place.
+
+    Outputs that do not depend on the stream input, the primary input if there is one
+    and otherwise any input node, are stray and removed with their branch. A prompt
+    without outputs is left unchanged.
+
+    Returns:
+        The ids of the removed nodes.
+    """
+    outputs = {key for key, node in prompt.items() if node.get("class_type") in PROMPT_OUTPUT_CLASS_TYPES}
+    if not outputs:
+        return set()
+
+    inputs = {key for key, node in prompt.items() if node.get("class_type") == "PrimaryInputLoadImage"}
+    if not inputs:
+        inputs = {key for key, node in prompt.items() if node.get("class_type") in PROMPT_INPUT_CLASS_TYPES}
+    stream_outputs = outputs & downstream_nodes(prompt, inputs)
+    return prune_unreachable_nodes(prompt, stream_outputs or outputs)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from utils.admission import AdmissionController, SessionLoad
+
+
+def test_admits_without_limits():
+    controller = AdmissionController()
+    assert controller.check([SessionLoad(fps=1.0, inference_time=1.0)] * 10) is None
+
+
+def test_admits_first_stream():
+    assert AdmissionController(fps_floor=30, max_sessions=1).check([]) is None
+
+
+def test_rejects_at_max_sessions():
+    controller = AdmissionController(max_sessions=2)
+    sessions = [SessionLoad(fps=30.0, inference_time=0.01)]
+
+    assert controller.check(sessions) is None
+    assert "Maximum of 2" in controller.check(sessions * 2)
+
+
+def test_rejects_when_running_streams_below_floor():
+    controller = AdmissionController(fps_floor=20)
+    sessions = [SessionLoad(fps=30.0, inference_time=None), SessionLoad(fps=15.0, inference_time=None)]
+
+    assert "below 20 FPS" in controller.check(sessions)
+
+
+def test_rejects_on_projected_round_time():
+    controller = AdmissionController(fps_floor=20)
+
+    # Two streams at 20ms a frame and a third like them take 60ms a round
+    sessions = [SessionLoad(fps=25.0, inference_time=0.02)] * 2
+    assert "projected 16.7 FPS" in controller.check(sessions)
+
+    # One stream at 20ms a frame projects 25 FPS with a second one
+    assert controller.check(sessions[:1]) is None
+
+
+def test_skips_unmeasured_streams():
+    controller = AdmissionController(fps_floor=20)
+
+    # Streams that have not produced output yet are neither judged by FPS nor by cost
+    sessions = [SessionLoad(fps=0.0, inference_time=None), SessionLoad(fps=30.0, inference_time=0.01)]
+    assert controller.check(sessions) is None
+    assert controller.check([SessionLoad(fps=0.0, inference_time=None)] * 5) is None
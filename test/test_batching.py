@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from comfystream.batching import BatchGroup, get_batch_group, join_batch_group, leave_batch_group
+from comfystream.tensor_cache import SessionChannels, SessionClosed
+
+
+def test_collect_batches_frames_of_members():
+    group = BatchGroup("group", max_batch_size=4, max_wait=1.0)
+    first, second = SessionChannels("first"), SessionChannels("second")
+    group.add(first)
+    group.add(second)
+
+    first.image_inputs.put("a")
+    second.image_inputs.put("b")
+
+    batch = group.collect()
+    assert [(channels.session_id, frame) for channels, frame in batch] == [("first", "a"), ("second", "b")]
+
+
+def test_collect_waits_for_other_members():
+    group = BatchGroup("group", max_batch_size=2, max_wait=1.0)
+    first, second = SessionChannels("first"), SessionChannels("second")
+    group.add(first)
+    group.add(second)
+
+    def put_later():
+        time.sleep(0.05)
+        second.image_inputs.put("b")
+        group.notify()
+
+    first.image_inputs.put("a")
+    thread = threading.Thread(target=put_later)
+    thread.start()
+    batch = group.collect()
+    thread.join()
+
+    assert sorted(frame for _, frame in batch) == ["a", "b"]
+
+
+def test_collect_max_wait_bounds_latency():
+    group = BatchGroup("group", max_batch_size=2, max_wait=0.01)
+    first, second = SessionChannels("first"), SessionChannels("second")
+    group.add(first)
+    group.add(second)
+
+    first.image_inputs.put("a")
+    assert [frame for _, frame in group.collect()] == ["a"]
+
+
+def test_deferred_frame_starts_next_batch():
+    group = BatchGroup("group", max_batch_size=2, max_wait=0.0)
+    first = SessionChannels("first")
+    group.add(first)
+
+    first.image_inputs.put("newer")
+    group.defer(first, "deferred")
+    assert [frame for _, frame in group.collect()] == ["deferred"]
+    assert [frame for _, frame in group.collect()] == ["newer"]
+
+
+def test_join_and_leave_batch_group():
+    channels = SessionChannels("member")
+    group = join_batch_group("group-registry", channels, max_batch_size=2)
+    assert get_batch_group("group-registry") is group
+
+    leave_batch_group(group, channels)
+    assert get_batch_group("group-registry") is None
+
+
+def test_dissolving_group_wakes_collecting_workers():
+    channels = SessionChannels("member")
+    group = join_batch_group("batch-dissolved", channels, max_batch_size=2)
+    errors = []
+
+    def collect():
+        try:
+            group.collect()
+        except SessionClosed as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=collect)
+    thread.start()
+    time.sleep(0.05)
+    leave_batch_group(group, channels)
+    thread.join(timeout=1)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    # Prompts still bound to the dissolved group fail instead of waiting on it
+    with pytest.raises(SessionClosed):
+        get_batch_group("batch-dissolved")
@@ -0,0 +1,41 @@
+import torch
+
+from comfystream.buffer_pool import FrameBufferPool
+from comfystream.frame_utils import to_uint8_image
+
+
+def test_acquire_reuses_released_buffer():
+    pool = FrameBufferPool()
+    buffer = pool.acquire((1, 4, 4, 3), torch.uint8)
+    pool.release(buffer)
+
+    assert pool.acquire((1, 4, 4, 3), torch.uint8) is buffer
+    assert pool.acquire((1, 4, 4, 3), torch.uint8) is not buffer
+
+
+def test_acquire_keyed_on_shape_and_dtype():
+    pool = FrameBufferPool()
+    buffer = pool.acquire((1, 4, 4, 3), torch.uint8)
+    pool.release(buffer)
+
+    assert pool.acquire((1, 8, 8, 3), torch.uint8) is not buffer
+    assert pool.acquire((1, 4, 4, 3), torch.float32) is not buffer
+
+
+def test_release_ignores_foreign_tensors():
+    pool = FrameBufferPool()
+    tensor = torch.zeros(1, 4, 4, 3, dtype=torch.uint8)
+    pool.release(tensor)
+
+    assert pool.acquire((1, 4, 4, 3), torch.uint8) is not tensor
+
+
+def test_to_uint8_image_with_pool():
+    pool = FrameBufferPool()
+    image = torch.rand(1, 4, 4, 3)
+
+    out = to_uint8_image(image, pool)
+    assert torch.equal(out, to_uint8_image(image))
+
+    pool.release(out)
+    assert to_uint8_image(image, pool) is out
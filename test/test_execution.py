@@ -0,0 +1,151 @@
+import pytest
+
+from comfystream.execution import ExecutionPlan, UnsupportedPromptError
+from comfystream.timing import PromptTimings
+
+
+class Source:
+    FUNCTION = "execute"
+    calls = 0
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT",)}}
+
+    def execute(self, value):
+        Source.calls += 1
+        return (value,)
+
+
+class LoadTensor:
+    FUNCTION = "execute"
+    frames = []
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {}
+
+    def execute(self):
+        return (LoadTensor.frames.pop(0),)
+
+
+class Add:
+    FUNCTION = "execute"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"a": ("INT",), "b": ("INT",)}}
+
+    def execute(self, a, b):
+        return {"ui": {}, "result": (a + b,)}
+
+
+class SaveTensor:
+    FUNCTION = "execute"
+    outputs = []
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"images": ("INT",)}, "hidden": {"unique_id": "UNIQUE_ID"}}
+
+    def execute(self, images, unique_id):
+        SaveTensor.outputs.append((unique_id, images))
+
+
+class ListInput:
+    FUNCTION = "execute"
+    INPUT_IS_LIST = True
+
+
+NODE_CLASSES = {
+    "Source": Source,
+    "LoadTensor": LoadTensor,
+    "Add": Add,
+    "SaveTensor": SaveTensor,
+    "ListInput": ListInput,
+}
+
+
+@pytest.fixture
+def prompt():
+    return {
+        "4": {"inputs": {"images": ["3", 0]}, "class_type": "SaveTensor"},
+        "3": {"inputs": {"a": ["1", 0], "b": ["2", 0]}, "class_type": "Add"},
+        "2": {"inputs": {}, "class_type": "LoadTensor"},
+        "1": {"inputs": {"value": 10}, "class_type": "Source"},
+    }
+
+
+def test_plan_runs_constant_nodes_once(prompt):
+    Source.calls = 0
+    LoadTensor.frames = [1, 2]
+    SaveTensor.outputs = []
+
+    plan = ExecutionPlan(prompt, NODE_CLASSES)
+    assert [node.node_id for node in plan.constant_nodes] == ["1"]
+    assert [node.node_id for node in plan.frame_nodes] == ["2", "3", "4"]
+
+    plan.run()
+    plan.run()
+
+    assert Source.calls == 1
+    assert SaveTensor.outputs == [("4", 11), ("4", 12)]
+
+
+def test_plan_unsupported_nodes():
+    with pytest.raises(UnsupportedPromptError):
+        ExecutionPlan({"1": {"inputs": {}, "class_type": "ListInput"}}, NODE_CLASSES)
+
+    with pytest.raises(UnsupportedPromptError):
+        ExecutionPlan({"1": {"inputs": {}, "class_type": "Missing"}}, NODE_CLASSES)
+
+
+def test_plan_precompute_pins_constant_outputs(prompt):
+    Source.calls = 0
+    plan = ExecutionPlan(prompt, NODE_CLASSES)
+
+    plan.precompute()
+    plan.precompute()
+    assert Source.calls == 1
+
+
+def test_plan_update_reuses_unchanged_constants(prompt):
+    Source.calls = 0
+    prompt["5"] = {"inputs": {"value": 1}, "class_type": "Source"}
+    plan = ExecutionPlan(prompt, NODE_CLASSES)
+    plan.precompute()
+    assert Source.calls == 2
+
+    prompt["5"]["inputs"]["value"] = 2
+    updated = ExecutionPlan(prompt, NODE_CLASSES, previous=plan)
+    assert updated.recomputed_nodes == ["5"]
+    updated.precompute()
+    assert Source.calls == 3
+
+    updated = ExecutionPlan(prompt, NODE_CLASSES, previous=updated)
+    assert updated.recomputed_nodes == []
+
+
+def test_plan_update_keeps_valid_node_instances(prompt):
+    plan = ExecutionPlan(prompt, NODE_CLASSES)
+    instances = {node.node_id: node.instance for node in plan.constant_nodes + plan.frame_nodes}
+
+    prompt["4"]["inputs"]["images"] = ["2", 0]
+    updated = ExecutionPlan(prompt, NODE_CLASSES, previous=plan)
+    updated_instances = {node.node_id: node.instance for node in updated.constant_nodes + updated.frame_nodes}
+
+    assert updated.diff.changed == {"4"}
+    assert all(updated_instances[node_id] is instances[node_id] for node_id in ("1", "2", "3"))
+    assert updated_instances["4"] is not instances["4"]
+
+
+def test_plan_run_records_node_timings(prompt):
+    LoadTensor.frames = [1]
+    timings = PromptTimings()
+
+    plan = ExecutionPlan(prompt, NODE_CLASSES)
+    plan.run(timings)
+
+    snapshot = timings.snapshot()
+    assert set(snapshot["nodes"]) == {"2", "3", "4"}
+    assert snapshot["nodes"]["3"]["class_type"] == "Add"
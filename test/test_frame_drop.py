@@ -0,0 +1,65 @@
+import pytest
+
+from queue import Queue
+from comfystream.frame_drop import (
+    AdaptivePolicy,
+    FrameDropPolicy,
+    LatestWinsPolicy,
+    SkipEveryNthPolicy,
+    create_frame_drop_policy,
+)
+
+
+def test_latest_wins_replaces_queued_frame():
+    queue = Queue(maxsize=1)
+    policy = LatestWinsPolicy()
+
+    assert policy.put(queue, 1)
+    assert policy.put(queue, 2)
+    assert queue.get_nowait() == 2
+    assert queue.empty()
+
+
+def test_skip_every_nth_drops_alternate_frames():
+    queue = Queue()
+    policy = SkipEveryNthPolicy(n=2)
+
+    accepted = [frame for frame in range(6) if policy.put(queue, frame)]
+    assert accepted == [0, 2, 4]
+
+
+def test_skip_every_nth_invalid():
+    with pytest.raises(ValueError):
+        SkipEveryNthPolicy(n=1)
+
+
+def test_adaptive_drops_while_busy():
+    queue = Queue(maxsize=1)
+    policy = AdaptivePolicy()
+    policy.input_interval = 0.01
+    policy.inference_time = 1.0
+    policy._last_input_time = None
+
+    policy.on_inference_start()
+    assert not policy.put(queue, 1)
+    assert queue.empty()
+
+    policy.on_inference_end()
+    assert policy.put(queue, 2)
+    assert queue.get_nowait() == 2
+
+
+def test_create_frame_drop_policy():
+    assert isinstance(create_frame_drop_policy(), LatestWinsPolicy)
+    assert create_frame_drop_policy("skip_nth", n=3).n == 3
+
+    policy = AdaptivePolicy()
+    assert create_frame_drop_policy(policy) is policy
+
+    with pytest.raises(ValueError):
+        create_frame_drop_policy("unknown")
+
+
+def test_frame_drop_policy_is_abstract():
+    with pytest.raises(TypeError):
+        FrameDropPolicy()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+from fractions import Fraction
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from utils.frame_store import PendingFrames
+
+TIME_BASE = Fraction(1, 90000)
+
+
+def test_pending_frames_pop_returns_timing():
+    frames = PendingFrames()
+    frames.add(0, 100, TIME_BASE)
+    frames.add(1, 200, TIME_BASE)
+
+    assert frames.pop(0) == (100, TIME_BASE)
+    assert len(frames) == 1
+    assert frames.pop(1) == (200, TIME_BASE)
+    assert len(frames) == 0
+
+
+def test_pending_frames_pop_evicts_older_frames():
+    frames = PendingFrames()
+    for seq in range(5):
+        frames.add(seq, seq * 100, TIME_BASE)
+
+    # Outputs of the frames before 3 will never arrive once 3 is processed
+    assert frames.pop(3) == (300, TIME_BASE)
+    assert len(frames) == 1
+    assert frames.pop(1) is None
+    assert frames.pop(4) == (400, TIME_BASE)
+
+
+def test_pending_frames_missing_seq():
+    frames = PendingFrames()
+    frames.add(2, 200, TIME_BASE)
+    frames.add(5, 500, TIME_BASE)
+
+    # A dropped frame is not in the store, older entries are still evicted
+    assert frames.pop(3) is None
+    assert len(frames) == 1
+    assert frames.pop(5) == (500, TIME_BASE)
+
+
+def test_pending_frames_bound():
+    frames = PendingFrames(maxlen=3)
+    for seq in range(10):
+        frames.add(seq, seq, TIME_BASE)
+
+    assert len(frames) == 3
+    assert frames.pop(6) is None
+    assert frames.pop(7) == (7, TIME_BASE)
+    assert len(frames) == 2
+
+    frames.clear()
+    assert len(frames) == 0
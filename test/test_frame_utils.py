@@ -0,0 +1,93 @@
+import av
+import numpy as np
+import torch
+
+from comfystream.buffer_pool import FrameBufferPool
+from comfystream.frame_utils import YUV420Planes, rgb_to_yuv420, to_float_image, to_uint8_image, yuv420p_planes
+
+
+def test_to_float_image_normalizes_uint8():
+    image = torch.tensor([[[[0, 51, 255]]]], dtype=torch.uint8)
+    out = to_float_image(image)
+
+    assert out.dtype == torch.float32
+    assert torch.allclose(out, torch.tensor([[[[0.0, 0.2, 1.0]]]]))
+
+
+def test_to_float_image_keeps_float():
+    image = torch.rand(1, 4, 4, 3)
+    assert to_float_image(image) is image
+
+
+def test_to_uint8_image_roundtrip():
+    image = torch.arange(256, dtype=torch.uint8).reshape(1, 16, 16, 1)
+    assert torch.equal(to_uint8_image(to_float_image(image)), image)
+
+
+def test_to_uint8_image_clamps():
+    image = torch.tensor([-0.5, 0.5, 1.5])
+    assert to_uint8_image(image).tolist() == [0, 127, 255]
+
+
+def test_yuv420p_planes_are_views():
+    frame = av.VideoFrame(33, 17, "yuv420p")
+    planes = yuv420p_planes(frame)
+
+    assert planes.y.shape == (17, 33)
+    assert planes.u.shape == (9, 17)
+    assert not planes.y.flags.owndata
+
+
+def test_to_float_image_from_yuv420p_matches_rgb24():
+    rgb = np.random.default_rng(0).integers(0, 256, (17, 25, 3), dtype=np.uint8)
+    rgb = rgb.repeat(2, axis=0).repeat(2, axis=1)
+    frame = av.VideoFrame.from_ndarray(rgb, format="rgb24").reformat(format="yuv420p")
+
+    out = to_float_image(yuv420p_planes(frame))
+    expected = torch.from_numpy(frame.to_ndarray(format="rgb24")).float() / 255.0
+
+    assert out.shape == (1, 34, 50, 3)
+    assert torch.allclose(out[0], expected, atol=3 / 255)
+
+
+def test_rgb_to_yuv420_luma_matches_swscale():
+    rgb = np.random.default_rng(0).integers(0, 256, (34, 50, 3), dtype=np.uint8)
+    frame = av.VideoFrame.from_ndarray(rgb, format="rgb24").reformat(format="yuv420p")
+    expected = torch.from_numpy(yuv420p_planes(frame).y.copy())
+
+    y, _, _ = rgb_to_yuv420(torch.from_numpy(rgb))
+    assert (y.int() - expected.int()).abs().max() <= 1
+
+
+def test_rgb_to_yuv420_roundtrip():
+    # Constant 2x2 blocks so chroma subsampling is lossless
+    rgb = np.random.default_rng(0).integers(0, 256, (17, 25, 3), dtype=np.uint8)
+    rgb = rgb.repeat(2, axis=0).repeat(2, axis=1)
+    image = to_float_image(torch.from_numpy(rgb).unsqueeze(0))
+
+    for source in (torch.from_numpy(rgb), image):
+        planes = YUV420Planes(*(plane.numpy() for plane in rgb_to_yuv420(source)))
+        assert planes.u.shape == (17, 25)
+        assert torch.allclose(to_float_image(planes), image, atol=3 / 255)
+
+
+def test_rgb_to_yuv420_odd_size():
+    y, u, v = rgb_to_yuv420(torch.zeros(1, 5, 7, 3))
+
+    assert y.shape == (5, 7)
+    assert u.shape == v.shape == (3, 4)
+    assert y.eq(16).all() and u.eq(128).all()
+
+
+def test_rgb_to_yuv420_with_pool():
+    pool = FrameBufferPool()
+    image = torch.rand(1, 6, 9, 3)
+
+    planes = rgb_to_yuv420(image, pool)
+    for plane, expected in zip(planes, rgb_to_yuv420(image)):
+        assert torch.equal(plane, expected)
+
+    # Intermediates went back to the pool, the released planes are reused next frame
+    for plane in planes:
+        pool.release(plane)
+    assert rgb_to_yuv420(image, pool)[0] is planes[0]
@@ -0,0 +1,85 @@
+import pytest
+
+from comfystream.graph import (
+    diff_prompts,
+    downstream_nodes,
+    find_constant_nodes,
+    prune_unreachable_nodes,
+    topological_order,
+    upstream_nodes,
+)
+
+
+@pytest.fixture
+def prompt():
+    return {
+        "4": {"inputs": {"images": ["3", 0]}, "class_type": "SaveTensor"},
+        "3": {"inputs": {"a": ["1", 0], "b": ["2", 0]}, "class_type": "Add"},
+        "2": {"inputs": {}, "class_type": "LoadTensor"},
+        "1": {"inputs": {"value": 10}, "class_type": "Source"},
+    }
+
+
+def test_topological_order(prompt):
+    order = topological_order(prompt)
+    assert order.index("1") < order.index("3")
+    assert order.index("2") < order.index("3") < order.index("4")
+
+
+def test_topological_order_cycle():
+    with pytest.raises(ValueError):
+        topological_order(
+            {
+                "1": {"inputs": {"a": ["2", 0]}, "class_type": "Add"},
+                "2": {"inputs": {"a": ["1", 0]}, "class_type": "Add"},
+            }
+        )
+
+
+def test_downstream_nodes(prompt):
+    assert downstream_nodes(prompt, {"2"}) == {"2", "3", "4"}
+
+
+def test_upstream_nodes(prompt):
+    assert upstream_nodes(prompt, {"3"}) == {"1", "2", "3"}
+
+
+def test_prune_unreachable_nodes(prompt):
+    prompt["5"] = {"inputs": {"value": 1}, "class_type": "Source"}
+    prompt["6"] = {"inputs": {"a": ["5", 0], "b": ["1", 0]}, "class_type": "Add"}
+
+    assert prune_unreachable_nodes(prompt, {"4"}) == {"5", "6"}
+    assert set(prompt) == {"1", "2", "3", "4"}
+
+
+def test_find_constant_nodes(prompt):
+    prompt["5"] = {"inputs": {"a": ["1", 0], "b": ["1", 0]}, "class_type": "Add"}
+    assert find_constant_nodes(prompt) == {"1", "5"}
+
+
+def test_diff_prompts_unchanged(prompt):
+    diff = diff_prompts(prompt, {node_id: dict(node) for node_id, node in prompt.items()})
+    assert not diff
+    assert diff.invalidated == set()
+
+
+def test_diff_prompts_changed_input(prompt):
+    updated = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in prompt.items()}
+    updated["1"]["inputs"]["value"] = 20
+
+    diff = diff_prompts(prompt, updated)
+    assert diff
+    assert diff.changed == {"1"}
+    assert diff.invalidated == {"1", "3", "4"}
+
+
+def test_diff_prompts_added_and_removed(prompt):
+    updated = dict(prompt)
+    del updated["4"]
+    updated["5"] = {"inputs": {"images": ["3", 0]}, "class_type": "SaveTensor"}
+
+    diff = diff_prompts(prompt, updated)
+    assert diff.added == {"5"}
+    assert diff.removed == {"4"}
+    assert diff.changed == set()
+    assert diff.invalidated == {"5"}
@@ -0,0 +1,65 @@
+import os
+
+from comfystream.node_metadata import NodeMetadataIndex, parse_input_spec
+
+
+class Sampler:
+    calls = 0
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        Sampler.calls += 1
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "steps": ("INT", {"default": 20, "min": 1, "max": 100}),
+                "sampler_name": (["euler", "ddim"],),
+            },
+            "optional": {"seed": ("INT", {"min": 0})},
+        }
+
+
+def test_parse_input_spec():
+    info = parse_input_spec(Sampler.INPUT_TYPES())
+    assert info["model"] == {"type": "MODEL"}
+    assert info["steps"] == {"type": "INT", "required": True, "min": 1, "max": 100, "widget": None}
+    assert info["sampler_name"] == {"type": "combo", "value": ["euler", "ddim"]}
+    assert info["seed"]["required"] is False
+
+
+def test_index_caches_input_specs():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"Sampler": Sampler}
+
+    Sampler.calls = 0
+    index = NodeMetadataIndex(load)
+    assert index.get("Sampler") is index.get("Sampler")
+    assert index.get("Missing") is None
+    assert len(loads) == 1
+    assert Sampler.calls == 1
+
+    index.invalidate()
+    index.get("Sampler")
+    assert len(loads) == 2
+    assert Sampler.calls == 2
+
+
+def test_index_refreshes_when_watched_path_changes(tmp_path):
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"Sampler": Sampler}
+
+    index = NodeMetadataIndex(load, watch_paths=[str(tmp_path)])
+    index.get("Sampler")
+    index.get("Sampler")
+    assert len(loads) == 1
+
+    stat = os.stat(tmp_path)
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    index.get("Sampler")
+    assert len(loads) == 2
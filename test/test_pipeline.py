@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+
+from fractions import Fraction
+
+import av
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import pipeline as pipeline_module
+from comfystream.buffer_pool import FrameBufferPool
+
+
+class ImmediateClient:
+    """Stands in for ComfyStreamClient, producing the output of a frame right after it is queued."""
+
+    def __init__(self, **kwargs):
+        self.buffer_pool = FrameBufferPool()
+        self.current_prompts = []
+        self.outputs = asyncio.Queue()
+        # Cleared to hold back outputs
+        self.running = asyncio.Event()
+        self.running.set()
+
+    def put_video_input(self, frame, droppable: bool = True) -> bool:
+        output = (frame.side_data.seq, torch.zeros(1, 16, 16, 3, dtype=torch.uint8))
+        # Produced later, like by the runners, so the longest waiting reader gets it
+        asyncio.get_running_loop().call_soon(self.outputs.put_nowait, output)
+        return True
+
+    async def get_sequenced_video_output(self):
+        await self.running.wait()
+        return await self.outputs.get()
+
+    def release_video_output(self, output):
+        self.buffer_pool.release(output)
+
+    async def cleanup(self):
+        pass
+
+
+def test_warmup_while_consumer_is_waiting(monkeypatch):
+    monkeypatch.setattr(pipeline_module, "ComfyStreamClient", ImmediateClient)
+
+    async def run():
+        pipeline = pipeline_module.Pipeline()
+        pipeline.width, pipeline.height = 16, 16
+
+        # The track is already waiting for the next output when the resolution changes
+        consumer = asyncio.create_task(pipeline.get_processed_video_frame())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(pipeline.start_video_warmup(), 1)
+        assert pipeline.video_ready
+        assert pipeline.warm_video_resolution == (16, 16)
+
+        frame = av.VideoFrame(16, 16, "yuv420p")
+        frame.pts = 3000
+        frame.time_base = Fraction(1, 90000)
+        await pipeline.put_video_frame(frame)
+        processed = await asyncio.wait_for(consumer, 1)
+
+        assert processed is not frame
+        assert processed.pts == 3000
+        # No warmup output is left behind to be sent as a stream frame
+        assert pipeline.client.outputs.empty()
+
+    asyncio.run(run())
+
+
+def test_frames_pass_through_during_warmup(monkeypatch):
+    monkeypatch.setattr(pipeline_module, "ComfyStreamClient", ImmediateClient)
+
+    async def run():
+        pipeline = pipeline_module.Pipeline()
+        pipeline.width, pipeline.height = 16, 16
+
+        pipeline.client.running.clear()
+        warmup = pipeline.start_video_warmup()
+        frame = av.VideoFrame(16, 16, "yuv420p")
+        await pipeline.put_video_frame(frame)
+        assert await asyncio.wait_for(pipeline.get_processed_video_frame(), 1) is frame
+        assert not warmup.done()
+
+        pipeline.client.running.set()
+        assert await asyncio.wait_for(pipeline.wait_ready(), 1)
+        assert warmup.done()
+
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+import asyncio
+
+from comfystream.prompt_updates import PromptUpdateCoalescer, resolve
+
+
+def test_latest_update_wins():
+    async def run():
+        coalescer = PromptUpdateCoalescer()
+        first = coalescer.submit("a")
+        second = coalescer.submit("b")
+
+        update, future = coalescer.take()
+        resolve(future, True)
+
+        assert not coalescer.pending
+        assert coalescer.take() is None
+        return update, await first, await second
+
+    assert asyncio.run(run()) == ("b", False, True)
+
+
+def test_discard_acknowledges_pending_update():
+    async def run():
+        coalescer = PromptUpdateCoalescer()
+        future = coalescer.submit("a")
+        coalescer.discard()
+        return coalescer.pending, await future
+
+    assert asyncio.run(run()) == (False, False)
+
+
+def test_resolve_ignores_cancelled_future():
+    async def run():
+        coalescer = PromptUpdateCoalescer()
+        future = coalescer.submit("a")
+        future.cancel()
+        _, taken = coalescer.take()
+        resolve(taken, True)
+        return taken.cancelled()
+
+    assert asyncio.run(run())
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from comfystream.queues import LoopBoundQueue, compact_audio
+
+
+def test_get_nowait_empty():
+    queue = LoopBoundQueue()
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+
+
+def test_put_from_thread_wakes_waiter():
+    async def run():
+        queue = LoopBoundQueue()
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        thread = threading.Thread(target=queue.put_nowait, args=("frame",))
+        thread.start()
+        thread.join()
+
+        return await asyncio.wait_for(getter, timeout=1)
+
+    assert asyncio.run(run()) == "frame"
+
+
+def test_items_from_thread_keep_order():
+    async def run():
+        queue = LoopBoundQueue()
+
+        def produce():
+            for i in range(100):
+                queue.put_nowait(i)
+
+        thread = threading.Thread(target=produce)
+        thread.start()
+        items = [await asyncio.wait_for(queue.get(), timeout=1) for _ in range(100)]
+        thread.join()
+        return items
+
+    assert asyncio.run(run()) == list(range(100))
+
+
+def test_cancelled_get_does_not_lose_item():
+    async def run():
+        queue = LoopBoundQueue()
+        cancelled = asyncio.create_task(queue.get())
+        waiting = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        queue.put_nowait("frame")
+        return await asyncio.wait_for(waiting, timeout=1)
+
+    assert asyncio.run(run()) == "frame"
+
+
+def test_bounded_queue_drops_oldest():
+    queue = LoopBoundQueue(maxsize=2)
+    for i in range(5):
+        queue.put_nowait(i)
+
+    assert queue.dropped == 3
+    assert [queue.get_nowait() for _ in range(queue.qsize())] == [3, 4]
+
+
+def test_bounded_queue_compacts_audio():
+    queue = LoopBoundQueue(maxsize=2, overflow=compact_audio)
+    for i in range(4):
+        queue.put_nowait(np.full(10, i, dtype=np.int16))
+
+    assert queue.dropped == 10
+    assert queue.get_nowait().tolist() == [1] * 10 + [2] * 10
+    assert queue.get_nowait().tolist() == [3] * 10
@@ -0,0 +1,86 @@
+import threading
+
+from comfystream.reorder import InFlightFrames, ReorderBuffer
+
+
+def test_in_flight_frames_per_thread():
+    in_flight = InFlightFrames()
+    in_flight.start(1)
+
+    def worker():
+        in_flight.start(2)
+        assert in_flight.current() == 2
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert in_flight.current() == 1
+    assert in_flight.oldest() == 1
+    in_flight.finish()
+    assert in_flight.current() is None
+    assert in_flight.oldest() == 2
+
+
+def test_reorder_holds_outputs_ahead_of_older_frames():
+    in_flight = InFlightFrames()
+    buffer = ReorderBuffer(in_flight)
+
+    # Frame 1 is still in flight on another worker when frame 2 finishes
+    in_flight.start(1)
+    buffer.push(2, "b")
+    assert buffer.pop() is None
+
+    buffer.push(1, "a")
+    in_flight.finish()
+    assert buffer.pop() == (1, "a")
+    assert buffer.pop() == (2, "b")
+    assert buffer.pop() is None
+
+
+def test_reorder_bounds_pending_outputs():
+    in_flight = InFlightFrames()
+    buffer = ReorderBuffer(in_flight, max_pending=2)
+
+    # Frame 1 never finishes, e.g. because its execution failed
+    in_flight.start(1)
+    buffer.push(2, "b")
+    buffer.push(3, "c")
+    assert buffer.pop() is None
+
+    buffer.push(4, "d")
+    assert buffer.pop() == (2, "b")
+    assert buffer.pop() is None
+
+
+def test_in_flight_frames_forgets_unfinished_frame():
+    in_flight = InFlightFrames()
+    in_flight.start(1)
+    in_flight.start(2)
+    assert in_flight.oldest() == 2
+
+
+def test_reorder_releases_unsequenced_outputs():
+    in_flight = InFlightFrames()
+    buffer = ReorderBuffer(in_flight)
+    in_flight.start(1)
+
+    buffer.push(None, "warmup")
+    assert buffer.pop() == (None, "warmup")
+
+
+def test_reorder_clear_returns_outputs():
+    buffer = ReorderBuffer(InFlightFrames())
+    buffer.push(2, "b")
+    buffer.push(1, "a")
+    assert sorted(buffer.clear()) == ["a", "b"]
+    assert len(buffer) == 0
+
+
+def test_in_flight_frames_finish_returns_elapsed():
+    in_flight = InFlightFrames()
+    assert in_flight.finish() is None
+
+    in_flight.start(1)
+    elapsed = in_flight.finish()
+    assert elapsed is not None and elapsed >= 0
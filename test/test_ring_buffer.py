@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from comfystream.ring_buffer import AudioRingBuffer
+
+
+def test_write_read_wraps_around():
+    buffer = AudioRingBuffer(8)
+    buffer.write(np.arange(6, dtype=np.int16))
+    assert buffer.read(4).tolist() == [0, 1, 2, 3]
+
+    buffer.write(np.arange(6, 12, dtype=np.int16))
+    assert len(buffer) == 8
+    assert buffer.capacity == 8
+    assert buffer.read(8).tolist() == list(range(4, 12))
+
+
+def test_peek_does_not_consume():
+    buffer = AudioRingBuffer(4)
+    buffer.write(np.array([1, 2, 3], dtype=np.int16))
+
+    assert buffer.peek(2).tolist() == [1, 2]
+    assert len(buffer) == 3
+
+
+def test_read_into_out():
+    buffer = AudioRingBuffer(4)
+    buffer.write(np.array([1, 2, 3], dtype=np.int16))
+    out = np.zeros(3, dtype=np.int16)
+
+    assert buffer.read(3, out=out) is not None
+    assert out.tolist() == [1, 2, 3]
+
+
+def test_write_grows_when_full():
+    buffer = AudioRingBuffer(4)
+    buffer.write(np.arange(3, dtype=np.int16))
+    buffer.skip(2)
+    buffer.write(np.arange(3, 10, dtype=np.int16))
+
+    assert buffer.capacity >= 8
+    assert buffer.read(8).tolist() == [2] + list(range(3, 10))
+
+
+def test_read_too_many():
+    buffer = AudioRingBuffer(4)
+    with pytest.raises(ValueError):
+        buffer.read(1)
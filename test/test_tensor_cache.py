@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from comfystream import tensor_cache
+
+
+def test_get_channels_isolated_per_session():
+    a = tensor_cache.get_channels("session-a")
+    b = tensor_cache.get_channels("session-b")
+
+    assert a is not b
+    assert a is tensor_cache.get_channels("session-a")
+
+    a.image_inputs.put("frame")
+    assert b.image_inputs.empty()
+
+    tensor_cache.remove_channels("session-a")
+    tensor_cache.remove_channels("session-b")
+
+
+def test_default_session_aliases_module_queues():
+    channels = tensor_cache.get_channels("")
+
+    assert channels.image_inputs is tensor_cache.image_inputs
+    assert channels.audio_outputs is tensor_cache.audio_outputs
+
+    tensor_cache.remove_channels(tensor_cache.DEFAULT_SESSION_ID)
+    assert tensor_cache.get_channels() is channels
+
+
+def test_close_wakes_waiting_nodes():
+    channels = tensor_cache.get_channels("session-closed")
+    errors = []
+
+    def wait_for_input():
+        try:
+            channels.get_input(channels.image_inputs)
+        except tensor_cache.SessionClosed as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wait_for_input) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    channels.close()
+    for thread in threads:
+        thread.join(timeout=1)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(errors) == 3
+
+    # Nodes starting after the session was closed fail right away
+    channels.clear_inputs()
+    with pytest.raises(tensor_cache.SessionClosed):
+        channels.get_input(channels.audio_inputs)
+    tensor_cache.remove_channels("session-closed")
@@ -0,0 +1,55 @@
+from comfystream.timing import LATENCY_BUCKETS_MS, LatencyWindow, NodeProgressTimer, PromptTimings
+
+
+def test_latency_window_snapshot():
+    latency = LatencyWindow(window=4)
+    for ms in [1, 3, 30, 300, 3000]:
+        latency.record(ms / 1000)
+
+    snapshot = latency.snapshot()
+    assert snapshot["count"] == 5
+    # Only the last 4 samples are kept
+    assert snapshot["max_ms"] == 3000
+    assert snapshot["p50_ms"] == 300
+    assert len(snapshot["histogram"]) == len(LATENCY_BUCKETS_MS) + 1
+    assert sum(snapshot["histogram"]) == 4
+    assert snapshot["histogram"][-1] == 1
+
+
+def test_latency_window_empty():
+    snapshot = LatencyWindow().snapshot()
+    assert snapshot["count"] == 0
+    assert snapshot["mean_ms"] is None
+
+
+def test_prompt_timings_snapshot():
+    timings = PromptTimings()
+    timings.record_node("3", "KSampler", 0.05)
+    timings.record_frame(0.06)
+
+    snapshot = timings.snapshot()
+    assert snapshot["frame"]["count"] == 1
+    assert snapshot["nodes"]["3"]["class_type"] == "KSampler"
+    assert snapshot["nodes"]["3"]["count"] == 1
+
+
+def test_node_progress_timer():
+    timer = NodeProgressTimer()
+    timings = PromptTimings()
+    prompt = {"1": {"class_type": "LoadTensor"}, "2": {"class_type": "SaveTensor"}}
+    timer.watch("a", prompt, timings)
+
+    timer.send_sync("executing", {"node": "1", "prompt_id": "a"})
+    timer.send_sync("executing", {"node": "2", "prompt_id": "a"})
+    # Events of other prompts and other events are ignored
+    timer.send_sync("executing", {"node": "9", "prompt_id": "b"})
+    timer.send_sync("progress", {"value": 1, "max": 2, "prompt_id": "a"})
+    timer.send_sync("executing", {"node": None, "prompt_id": "a"})
+    timer.unwatch("a")
+    timer.send_sync("executing", {"node": "1", "prompt_id": "a"})
+
+    snapshot = timings.snapshot()
+    assert set(snapshot["nodes"]) == {"1", "2"}
+    assert snapshot["nodes"]["1"]["class_type"] == "LoadTensor"
+    assert snapshot["nodes"]["1"]["count"] == 1
+    assert snapshot["nodes"]["2"]["count"] == 1
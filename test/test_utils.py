@@ -1,7 +1,8 @@
 import pytest
 
 from comfy.api.components.schema.prompt import Prompt
-from comfystream.utils import convert_prompt
+from comfystream import utils
+from comfystream.utils import clear_convert_prompt_cache, convert_prompt
 
 
 @pytest.fixture
@@ -136,13 +137,9 @@ def test_convert_prompt_basic(prompt_basic):
 def test_convert_prompt_primary_input(prompt_primary_input):
     prompt = convert_prompt(prompt_primary_input)
 
+    # The secondary LoadImage does not feed the output and is pruned
     exp = Prompt.validate(
         {
-            "12": {
-                "inputs": {"image": "sampled_frame.jpg", "upload": "image"},
-                "class_type": "LoadImage",
-                "_meta": {"title": "Load Image"},
-            },
             "13": {
                 "inputs": {},
                 "class_type": "LoadTensor",
@@ -156,3 +153,88 @@ def test_convert_prompt_primary_input(prompt_primary_input):
         }
     )
     assert prompt == exp
+
+
+def test_convert_prompt_session_id(prompt_basic):
+    prompt = convert_prompt(prompt_basic, session_id="stream-1")
+
+    exp = Prompt.validate(
+        {
+            "12": {
+                "inputs": {"session_id": "stream-1"},
+                "class_type": "LoadTensor",
+                "_meta": {"title": "LoadTensor"},
+            },
+            "13": {
+                "inputs": {"images": ["12", 0], "session_id": "stream-1"},
+                "class_type": "SaveTensor",
+                "_meta": {"title": "SaveTensor"},
+            },
+        }
+    )
+    assert prompt == exp
+
+
+def test_convert_prompt_cached(prompt_basic):
+    clear_convert_prompt_cache()
+    prompt = convert_prompt(prompt_basic)
+
+    # Same content in a different key order hits the cache
+    reordered = {key: prompt_basic[key] for key in reversed(list(prompt_basic))}
+    assert convert_prompt(reordered) is prompt
+
+    prompt_basic["13"]["_meta"]["title"] = "Preview"
+    assert convert_prompt(prompt_basic) is not prompt
+
+
+def test_convert_prompt_cache_shared_by_sessions(prompt_basic, monkeypatch):
+    clear_convert_prompt_cache()
+    conversions = []
+    convert = utils._convert_prompt
+    monkeypatch.setattr(utils, "_convert_prompt", lambda prompt: conversions.append(prompt) or convert(prompt))
+
+    first = convert_prompt(prompt_basic, session_id="stream-1")
+    # A new session running the same prompt, e.g. a reconnecting client, hits the cache
+    second = convert_prompt(prompt_basic, session_id="stream-2")
+
+    assert len(conversions) == 1
+    assert first["12"]["inputs"]["session_id"] == "stream-1"
+    assert second["12"]["inputs"]["session_id"] == "stream-2"
+    assert second["13"]["inputs"]["session_id"] == "stream-2"
+
+    # The binding is kept for the session until it is released
+    assert convert_prompt(prompt_basic, session_id="stream-1") is first
+    utils.release_session_prompts("stream-1")
+    assert convert_prompt(prompt_basic, session_id="stream-1") is not first
+    assert len(conversions) == 1
+
+
+def test_convert_prompt_prunes_unreachable_nodes(prompt_basic):
+    prompt_basic["20"] = {
+        "inputs": {"ckpt_name": "model.safetensors"},
+        "class_type": "CheckpointLoaderSimple",
+    }
+    prompt = convert_prompt(prompt_basic)
+    assert "20" not in prompt
+    assert set(prompt) == {"12", "13"}
+
+
+def test_convert_prompt_prunes_stray_inputs_and_outputs(prompt_basic):
+    # An unconnected second input and an output not fed by the stream input
+    prompt_basic["20"] = {
+        "inputs": {"image": "reference.jpg", "upload": "image"},
+        "class_type": "LoadImage",
+    }
+    prompt_basic["21"] = {
+        "inputs": {"width": 512, "height": 512, "batch_size": 1},
+        "class_type": "EmptyImage",
+    }
+    prompt_basic["22"] = {
+        "inputs": {"images": ["21", 0]},
+        "class_type": "PreviewImage",
+    }
+    prompt = convert_prompt(prompt_basic)
+
+    assert set(prompt) == {"12", "13"}
+    assert prompt["12"]["class_type"] == "LoadTensor"
+    assert prompt["13"]["class_type"] == "SaveTensor"
@@ -172,6 +172,10 @@ export const ControlPanel = ({
             if (!data.success) {
               console.error("[ControlPanel] Failed to update prompt");
             }
+          } else if (data.type === "ready") {
+            if (!data.success) {
+              console.error("[ControlPanel] Failed to warm pipeline");
+            }
           }
         } catch (error) {
           console.error("[ControlPanel] Error parsing node info:", error);